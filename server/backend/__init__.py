@@ -1,5 +1,7 @@
 import backend.auth as auth
 import backend.connect as connect
 import backend.groups as groups
+import backend.hashing as hashing
 import backend.items as items
+import backend.permissions as permissions
 import backend.projects as projects
\ No newline at end of file
@@ -1,40 +1,42 @@
-from backend.connect import queryData, writeData
-from passlib.hash import bcrypt
-import random
-
-def generate_userkey(connection, data) -> tuple[str, str]:
-    rows = []
-    with connection:
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT username,useruuid FROM users;")
-            rows = cursor.fetchall()
-
-    username = data['username']
-    if username in [row[0] for row in rows]:
-        raise DuplicateData("Username " + username + " already exists!")
-    uuids = [row[1] for row in rows]
-    
-    acceptableValues = list(range(48, 58))
-    acceptableValues.extend(range(65, 91))
-    acceptableValues.extend(range(97, 123))
-
-    # Allows for over 5 * 10^114 uuids
-    while True:
-        uid = ""
-        for i in range(64):
-            uid += chr(random.choice(acceptableValues))
-        if uid not in uuids:
-            break
-
-    return uid, bcrypt.hash(data['password'])
-
-def validate(connection, data) -> tuple[bool, str | None]:
-    hash = queryData(connection, "SELECT password FROM users WHERE username = %s;", data['username'], fetchAll=False)[0]
-
-    if hash is None or not bcrypt.verify(data['password'], hash):
-        return False, "Invalid password!"
-
-    return True, None
+from backend import hashing
+from backend.connect import invalidateAfter, prepare, queryData, savepoint, transaction, writeData
+from concurrent.futures import Future
+from psycopg2.errors import UniqueViolation
+from string import ascii_lowercase, ascii_uppercase, digits
+import secrets
+
+from utils import LRUCache, MISSING
+
+# Directory of users, filled lazily as names are resolved. Misses aren't cached, so a new account is visible immediately.
+DIRECTORY_SIZE = 4096
+_uuids_by_name = LRUCache(DIRECTORY_SIZE)
+_names_by_uuid = LRUCache(DIRECTORY_SIZE)
+
+USERKEY_CHARACTERS = digits + ascii_uppercase + ascii_lowercase
+# A fresh uuid colliding even once is next to impossible, so repeated collisions mean something else is wrong
+UUID_ATTEMPTS = 3
+
+PASSWORD_BY_NAME = prepare("auth_password_by_name", "SELECT password FROM users WHERE lower(username) = lower(%s);")
+PASSWORD_BY_UUID = prepare("auth_password_by_uuid", "SELECT password FROM users WHERE useruuid = %s;")
+USER_BY_NAME = prepare("auth_user_by_name", "SELECT useruuid,username FROM users WHERE lower(username) = lower(%s);")
+NAME_BY_UUID = prepare("auth_name_by_uuid", "SELECT username FROM users WHERE useruuid = %s;")
+# Serialises account creation per username, ignoring case, until the transaction ends, so it doesn't rely on the index
+LOCK_USERNAME = prepare("auth_lock_username", "SELECT pg_advisory_xact_lock(hashtext(lower(%s)));")
+CREATE_USER = prepare("auth_create_user", "INSERT INTO users(useruuid, username, password) SELECT %s,%s,%s " \
+    "WHERE NOT EXISTS (SELECT 1 FROM users WHERE lower(username) = lower(%s)) RETURNING useruuid;")
+
+def generate_userkey() -> str:
+    """Generate a random user id. Allows for over 5 * 10^114 uuids, so uniqueness is left to the users primary key."""
+    return "".join(secrets.choice(USERKEY_CHARACTERS) for i in range(64))
+
+def hash_password(password: str) -> Future:
+    """Queue hashing of the password on the hashing pool. The returned future resolves to the hash."""
+    return hashing.HASHER.hash(password)
+
+def validate(connection, data) -> Future:
+    """Queue verification of the login's password against the stored hash. The returned future resolves to True iff they match."""
+    hash = queryData(connection, PASSWORD_BY_NAME, data['username'], fetchAll=False)[0]
+    return hashing.HASHER.verify(data['password'], hash)
     
 def update_username(connection, uuid, new_username) -> tuple[bool, str | None]:
     if get_username_from_uuid(connection, uuid) == new_username:
@@ -43,31 +45,106 @@ def update_username(connection, uuid, new_username) -> tuple[bool, str | None]:
     if username_exists(connection, new_username):
         return False, "You can't set your username to an existing username!"
     
+    old_username = get_username_from_uuid(connection, uuid)
     writeData(connection, "UPDATE users SET username = %s WHERE useruuid = %s;", new_username, uuid)
+    invalidateAfter(connection, invalidate_user, uuid, old_username, new_username)
     return True, None
 
-def update_password(connection, uuid, new_password) -> tuple[bool, str | None]:
-    hash = queryData(connection, "SELECT password FROM users WHERE useruuid = %s;", uuid, fetchAll=False)[0]
-
-    if bcrypt.verify(new_password, hash):
-        return False, "You must specify a new password!"
-
-    writeData(connection, "UPDATE users SET password = %s WHERE useruuid = %s;", bcrypt.hash(new_password), uuid)
-    return True, None
-
-def user_exists(connection, uuid):
-    uuids = queryData(connection, "SELECT useruuid FROM users;")
-    return uuid in [uuids[0] for uid in uuids]
-
-def username_exists(connection, username):
-    usernames = queryData(connection, "SELECT username FROM users;")
-    return username.lower() in [user[0].lower() for user in usernames]
-
-def get_uuid_from_username(connection, username):
-    return queryData(connection, "SELECT useruuid FROM users WHERE username = %s;", username, fetchAll=False)[0]
-
-def get_username_from_uuid(connection, uuid):
-    return queryData(connection, "SELECT username FROM users WHERE useruuid = %s;", uuid, fetchAll=False)[0]
+def update_password(connection, uuid, new_password) -> Future:
+    """
+    Queue hashing of a new password for the user, without waiting on the hashing pool.\n
+    The returned future resolves to the new hash, or None if the password is unchanged; store it with set_password.
+    Raises QueueFull if the pool is too busy to take the check, and the future fails with it if it can't take the hashing.
+    """
+    hash = queryData(connection, PASSWORD_BY_UUID, uuid, fetchAll=False)[0]
+    result = Future()
+
+    def hashed(job: Future) -> None:
+        if job.exception() is not None:
+            result.set_exception(job.exception())
+        else:
+            result.set_result(job.result())
+
+    def verified(job: Future) -> None:
+        try:
+            if job.result():
+                result.set_result(None)
+                return
+            hash_password(new_password).add_done_callback(hashed)
+        except Exception as error:
+            result.set_exception(error)
+
+    hashing.HASHER.verify(new_password, hash).add_done_callback(verified)
+    return result
+
+def set_password(connection, uuid, hashword) -> None:
+    """Store a password hash from update_password for the user."""
+    writeData(connection, "UPDATE users SET password = %s WHERE useruuid = %s;", hashword, uuid)
+
+def create_user(connection, username, hashword) -> str:
+    """
+    Create a user with the username and password hash, returning their new uuid.
+
+    Raises DuplicateData if the username is already taken, ignoring case.
+    """
+    with transaction(connection):
+        # Taken in a statement of its own, so the insert's snapshot already sees any account created while waiting on it
+        queryData(connection, LOCK_USERNAME, username, fetchAll=False)
+        for attempt in range(UUID_ATTEMPTS):
+            uuid = generate_userkey()
+            try:
+                with savepoint(connection):
+                    created = writeData(connection, CREATE_USER, uuid, username, hashword, username)
+            except UniqueViolation as error:
+                if error.diag.constraint_name == "users_username_lower":
+                    created = None
+                elif attempt + 1 < UUID_ATTEMPTS: # The uuid was taken
+                    continue
+                else:
+                    raise
+            if not created:
+                raise DuplicateData("Username " + username + " already exists!")
+            invalidateAfter(connection, invalidate_user, uuid, username)
+            return uuid
+
+def user_exists(connection, uuid) -> bool:
+    return get_username_from_uuid(connection, uuid) is not None
+
+def username_exists(connection, username) -> bool:
+    """Check if the username is taken, ignoring case."""
+    return get_uuid_from_username(connection, username) is not None
+
+def get_uuid_from_username(connection, username) -> str | None:
+    """Get the uuid of the user with the username, ignoring case. This is a point lookup on the users_username_lower index."""
+    uuid = _uuids_by_name.get(username.lower())
+    if uuid is MISSING:
+        row = queryData(connection, USER_BY_NAME, username, fetchAll=False)
+        if row is None:
+            return None
+        uuid = row[0]
+        _uuids_by_name.put(username.lower(), uuid)
+        _names_by_uuid.put(uuid, row[1])
+    return uuid
+
+def get_username_from_uuid(connection, uuid) -> str | None:
+    username = _names_by_uuid.get(uuid)
+    if username is MISSING:
+        row = queryData(connection, NAME_BY_UUID, uuid, fetchAll=False)
+        if row is None:
+            return None
+        username = row[0]
+        _names_by_uuid.put(uuid, username)
+        _uuids_by_name.put(username.lower(), uuid)
+    return username
+
+def invalidate_user(uuid, *usernames) -> None:
+    """Drop the cached directory entries for the user and any of their current or previous usernames."""
+    _names_by_uuid.invalidate(uuid)
+    for username in usernames:
+        _uuids_by_name.invalidate(username.lower())
+
+def directory_stats() -> dict[str, dict[str, int]]:
+    return {'uuids_by_name': _uuids_by_name.stats(), 'names_by_uuid': _names_by_uuid.stats()}
 
 
 
@@ -1,32 +1,408 @@
+import asyncio
 import psycopg2
-from config import load_config
+import re
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from itertools import count
+from psycopg2.errors import InvalidSqlStatementName
+from threading import Condition
+from time import monotonic
+from typing import Callable
+
+from config import load_config, load_options
+
+POOL_DEFAULTS = {
+    'minconn': "2",
+    'maxconn': "10",
+    'timeout': "5",
+    'health_check_interval': "30"
+}
+
+class PreparingConnection(psycopg2.extensions.connection):
+    """A connection that remembers which named statements have already been prepared on it, and the unit of work open on it."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared: set[str] = set()
+        self.unit: list[Callable[[bool], None]] | None = None
+
+
+class Statement():
+    """
+    A named query, which is prepared once on each connection it runs on and executed by name after that, so the
+    server only parses and plans it once per connection.
+
+    The query is written with the usual %s placeholders. Connections that can't track prepared statements run the
+    query text directly.
+    """
+    def __init__(self, name: str, query: str):
+        self.name = name
+        self.query = query
+        self.returning = "returning" in query.lower()
+
+        parameters = query.count("%s")
+        numbers = iter(range(1, parameters + 1))
+        self._prepare = f"PREPARE {name} AS " + re.sub("%s", lambda match: f"${next(numbers)}", query)
+        self._execute = f"EXECUTE {name}" + ("(" + ", ".join(["%s"] * parameters) + ")" if parameters != 0 else "") + ";"
+
+    def run(self, cursor, args: tuple) -> None:
+        prepared = getattr(cursor.connection, "prepared", None)
+        if prepared is None:
+            cursor.execute(self.query, args)
+            return
+        if self.name not in prepared:
+            cursor.execute(self._prepare)
+            prepared.add(self.name)
+        try:
+            cursor.execute(self._execute, args)
+        except InvalidSqlStatementName: # Deallocated behind our back, so prepare it again next time
+            prepared.discard(self.name)
+            raise
+
+STATEMENTS: dict[str, Statement] = {}
+
+def prepare(name: str, query: str) -> Statement:
+    """Register a named statement for queryData and writeData to execute. Names are shared by every connection."""
+    statement = STATEMENTS.get(name)
+    if statement is not None:
+        if statement.query != query:
+            raise ValueError(f"Statement {name} is already registered with a different query")
+        return statement
+    statement = STATEMENTS[name] = Statement(name, query)
+    return statement
+
+def _execute(cursor, query: str | Statement, args: tuple) -> None:
+    if isinstance(query, Statement):
+        query.run(cursor, args)
+    else:
+        cursor.execute(query, args)
 
 def openConnection(filename='database.ini'):
     """ Connect to the PostGreSQL Server """
     config = load_config(filename)
     try:
         # connecting to the PostgreSQL server
-        return psycopg2.connect(**config)
+        return psycopg2.connect(**config, connection_factory=PreparingConnection)
     except (psycopg2.DatabaseError, Exception) as error:
         print(error)
 
-def queryData(connection, query: str, *args: str, fetchAll = True):
-    with connection:
+def _scope(connection):
+    """The transaction a single call runs in: the unit of work open on the connection, or else one of its own."""
+    return nullcontext() if getattr(connection, "unit", None) is not None else connection
+
+def queryData(connection, query: str | Statement, *args: str, fetchAll = True):
+    with _scope(connection):
         with connection.cursor() as cursor:
-            cursor.execute(query, args)
+            _execute(cursor, query, args)
 
             if fetchAll:
                 return cursor.fetchall()
             else:
                 return cursor.fetchone()
 
-def writeData(connection, query: str, *args: str):
+def writeData(connection, query: str | Statement, *args: str):
     result = None
-    with connection:
+    with _scope(connection): # Commits at the end of the block, unless a unit of work is open
         with connection.cursor() as cursor:
-            cursor.execute(query, args)
-            if "returning" in query.lower():
+            _execute(cursor, query, args)
+            if query.returning if isinstance(query, Statement) else "returning" in query.lower():
                 result = cursor.fetchall()
-        connection.commit() # Auto called at end of with block, but nice to call explicitly
     if result is not None:
-        return result
\ No newline at end of file
+        return result
+
+_cursor_ids = count()
+
+def streamData(connection, query: str | Statement, *args: str, chunkSize = 500):
+    """
+    Run a query through a server-side cursor, yielding its rows in lists of at most chunkSize.
+
+    Only one chunk is held in memory at a time. The generator must be run to completion to end its transaction.
+    Server-side cursors can't be declared over a prepared statement, so statements are run from their query text.
+    """
+    if isinstance(query, Statement):
+        query = query.query
+    with _scope(connection):
+        with connection.cursor(name=f"sgu_stream_{next(_cursor_ids)}") as cursor:
+            cursor.itersize = chunkSize
+            cursor.execute(query, args)
+            while True:
+                rows = cursor.fetchmany(chunkSize)
+                if len(rows) == 0:
+                    return
+                yield rows
+
+
+def _begin(connection) -> None:
+    connection.unit = []
+
+def _end(connection, commit: bool) -> None:
+    callbacks, connection.unit = connection.unit, None
+    try:
+        if commit:
+            connection.commit()
+        else:
+            connection.rollback()
+    except Exception:
+        if not connection.closed:
+            connection.rollback()
+        commit = False
+        raise
+    finally:
+        for callback in callbacks:
+            callback(commit)
+
+@contextmanager
+def transaction(connection):
+    """
+    Open a unit of work on the connection. Every query and write made on it inside the block shares a single
+    transaction, which is committed when the block ends, or rolled back if it raises.
+
+    Nested units share the outer one. Leased connections are already inside a unit for the whole lease.
+    """
+    if connection.unit is not None:
+        yield connection
+        return
+
+    _begin(connection)
+    try:
+        yield connection
+    except BaseException:
+        _end(connection, False)
+        raise
+    _end(connection, True)
+
+@contextmanager
+def savepoint(connection, name: str = "sgu_savepoint"):
+    """Let a statement fail without aborting the unit of work it runs in, by rolling back to just before it."""
+    if getattr(connection, "unit", None) is None:
+        yield
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"SAVEPOINT {name};")
+    try:
+        yield
+    except BaseException:
+        with connection.cursor() as cursor:
+            cursor.execute(f"ROLLBACK TO SAVEPOINT {name};")
+        raise
+    with connection.cursor() as cursor:
+        cursor.execute(f"RELEASE SAVEPOINT {name};")
+
+def afterTransaction(connection, callback: Callable[[bool], None]) -> None:
+    """
+    Run the callback once the unit of work open on the connection ends, with whether it was committed.\n
+    Without a unit of work, every write has already been committed, so it is run straight away.
+    """
+    if getattr(connection, "unit", None) is None:
+        callback(True)
+    else:
+        connection.unit.append(callback)
+
+def invalidateAfter(connection, invalidate: Callable, *args) -> None:
+    """
+    Drop cached entries now, and again once the unit of work ends, so nothing cached while the transaction was open
+    outlives it, whether it commits or not.
+    """
+    invalidate(*args)
+    if getattr(connection, "unit", None) is not None:
+        connection.unit.append(lambda committed: invalidate(*args))
+
+
+class PoolTimeout(Exception):
+    def __init__(self, timeout: float, *args):
+        super().__init__(*args)
+
+        self.errorMsg = f"Timed out after {timeout}s waiting for a database connection"
+
+class PoolClosed(Exception):
+    pass
+
+
+class ConnectionPool():
+    """
+    A bounded pool of PostGreSQL connections shared by every client.
+
+    Connections are opened on demand up to maxconn, and any connection that has sat idle for longer than
+    health_check_interval seconds is pinged before being handed out again. The first minconn are opened by open.
+    """
+    def __init__(self, config: dict[str, str], minconn: int = 2, maxconn: int = 10, timeout: float = 5, health_check_interval: float = 30):
+        self._config = config
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+
+        self._idle: list[tuple[any, float]] = []
+        self._size = 0
+        self._closed = False
+        self._condition = Condition()
+
+    def open(self) -> None:
+        """Open the first minconn connections, so the first clients don't wait on them."""
+        with self._condition:
+            while self._size < self.minconn:
+                self._idle.append((psycopg2.connect(**self._config, connection_factory=PreparingConnection), monotonic()))
+                self._size += 1
+
+    def _healthy(self, connection, last_used: float) -> bool:
+        if connection.closed:
+            return False
+        if monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1;")
+            connection.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, connection) -> None:
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    def acquire(self, timeout: float | None = None):
+        """Take a connection from the pool, waiting at most timeout seconds for one to be released."""
+        deadline = monotonic() + (self.timeout if timeout is None else timeout)
+        while True:
+            with self._condition:
+                while not self._idle and self._size >= self.maxconn:
+                    if self._closed:
+                        raise PoolClosed()
+                    remaining = deadline - monotonic()
+                    if remaining <= 0 or not self._condition.wait(remaining):
+                        raise PoolTimeout(self.timeout if timeout is None else timeout)
+                if self._closed:
+                    raise PoolClosed()
+                if self._idle:
+                    connection, last_used = self._idle.pop()
+                else:
+                    self._size += 1
+                    connection, last_used = None, 0.0
+
+            if connection is None:
+                try:
+                    return psycopg2.connect(**self._config, connection_factory=PreparingConnection)
+                except Exception:
+                    with self._condition:
+                        self._size -= 1
+                        self._condition.notify()
+                    raise
+            if self._healthy(connection, last_used):
+                return connection
+            self._discard(connection)
+
+    async def acquire_async(self, timeout: float | None = None):
+        """Take a connection from the pool without blocking the running event loop."""
+        return await asyncio.to_thread(self.acquire, timeout)
+
+    def release(self, connection) -> None:
+        """Return a connection to the pool. Any transaction left open on it is rolled back."""
+        if connection.closed:
+            self._discard(connection)
+            return
+        if connection.status != psycopg2.extensions.STATUS_READY:
+            try:
+                connection.rollback()
+            except psycopg2.Error:
+                self._discard(connection)
+                return
+        with self._condition:
+            if self._closed:
+                self._size -= 1
+                connection.close()
+                return
+            self._idle.append((connection, monotonic()))
+            self._condition.notify()
+
+    def close(self) -> None:
+        """Close every idle connection. Connections still in use are closed when they are released."""
+        with self._condition:
+            self._closed = True
+            for connection, last_used in self._idle:
+                connection.close()
+            self._size -= len(self._idle)
+            self._idle.clear()
+            self._condition.notify_all()
+
+    def stats(self) -> dict[str, int]:
+        with self._condition:
+            return {'size': self._size, 'idle': len(self._idle), 'in_use': self._size - len(self._idle), 'max': self.maxconn}
+
+
+POOL: ConnectionPool | None = None
+
+class _Lease():
+    def __init__(self):
+        self.connection = None
+
+_lease: ContextVar[_Lease | None] = ContextVar("lease", default=None)
+
+def openPool(filename='database.ini') -> ConnectionPool:
+    """
+    Create the shared connection pool, using the optional [pool] section of the options file for its limits.\n
+    No connections are opened until the pool is opened or used.
+    """
+    global POOL
+    options = load_options(filename, 'pool', POOL_DEFAULTS)
+    POOL = ConnectionPool(load_config(filename),
+        int(options['minconn']), int(options['maxconn']),
+        float(options['timeout']), float(options['health_check_interval'])
+    )
+    return POOL
+
+@contextmanager
+def lease():
+    """
+    Scope a pooled connection to a block of work, such as a single event handler.
+
+    The connection is only taken from the pool on the first call to leasedConnection, and is returned when the
+    outermost lease ends. Nested leases share the outer one.
+    Everything done on the connection is a single unit of work, committed when the lease ends, or rolled back if the
+    block raises.
+    """
+    if _lease.get() is not None:
+        yield
+        return
+
+    current = _Lease()
+    token = _lease.set(current)
+    try:
+        yield
+    except BaseException:
+        if current.connection is not None:
+            _end(current.connection, False)
+        raise
+    else:
+        if current.connection is not None:
+            _end(current.connection, True)
+    finally:
+        _lease.reset(token)
+        if current.connection is not None:
+            POOL.release(current.connection)
+
+def _on_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+def leasedConnection():
+    """
+    Get the connection for the active lease, taking one from the pool if this is the first use.\n
+    On the event loop's own thread the pool is never waited on, since that would stall every client; PoolTimeout is
+    raised straight away if no connection is free.
+    """
+    current = _lease.get()
+    if current is None:
+        raise RuntimeError("A connection can only be used inside of a lease")
+    if current.connection is None:
+        current.connection = POOL.acquire(0 if _on_loop() else None)
+        _begin(current.connection)
+    return current.connection
\ No newline at end of file
@@ -0,0 +1,120 @@
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import get_context
+from os import cpu_count
+from threading import Lock
+from passlib.hash import bcrypt
+
+from config import load_options
+
+HASHING_DEFAULTS = {
+    'workers': str(cpu_count() or 1),
+    'max_concurrent': str(cpu_count() or 1),
+    'max_queued': "1024"
+}
+
+def _hash(password: str) -> str:
+    return bcrypt.hash(password)
+
+def _verify(password: str, hash: str) -> bool:
+    return bcrypt.verify(password, hash)
+
+
+class QueueFull(Exception):
+    def __init__(self, *args):
+        super().__init__(*args)
+
+        self.errorMsg = "The server is busy, please try logging in again shortly!"
+
+
+class HashingQueue():
+    """
+    Runs bcrypt hashing and verification on a process pool, away from the event loop and the worker threads. The pool
+    is created by start.
+
+    At most max_concurrent jobs are admitted to the pool at once; the rest wait in a queue of up to max_queued jobs, and
+    anything past that is rejected with QueueFull.
+    """
+    def __init__(self, workers: int, max_concurrent: int, max_queued: int):
+        self.workers = workers
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+
+        self._executor: ProcessPoolExecutor | None = None
+        self._waiting: deque[tuple[Future, callable, tuple]] = deque()
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._lock = Lock()
+
+    def _submit(self, fn, *args) -> Future:
+        future = Future()
+        with self._lock:
+            if self._running >= self.max_concurrent:
+                if len(self._waiting) >= self.max_queued:
+                    self._rejected += 1
+                    raise QueueFull()
+                self._waiting.append((future, fn, args))
+                return future
+            self._running += 1
+        self._start(future, fn, args)
+        return future
+
+    def _start(self, future: Future, fn, args: tuple) -> None:
+        self._executor.submit(fn, *args).add_done_callback(lambda job: self._finish(future, job))
+
+    def _finish(self, future: Future, job: Future) -> None:
+        with self._lock:
+            self._completed += 1
+            next_job = self._waiting.popleft() if self._waiting else None
+            if next_job is None:
+                self._running -= 1
+        if next_job is not None:
+            self._start(*next_job)
+
+        if job.exception() is not None:
+            future.set_exception(job.exception())
+        else:
+            future.set_result(job.result())
+
+    def start(self) -> None:
+        """
+        Create the process pool. Its processes are spawned on every platform, so each one imports the server's main
+        module afresh, and nothing the server opens is inherited by them. Importing the server's modules must not
+        have side effects for that reason: the connection pool and item journal are only opened by openBackends.
+        """
+        self._executor = ProcessPoolExecutor(self.workers, mp_context=get_context("spawn"))
+        # Spawning a process takes a while, so the first one is started here rather than on the first login
+        self._executor.submit(abs, 0).result()
+
+    def hash(self, password: str) -> Future:
+        """Queue hashing of the password. The returned future resolves to the hash."""
+        return self._submit(_hash, password)
+
+    def verify(self, password: str, hash: str) -> Future:
+        """Queue verification of the password against the hash. The returned future resolves to True iff they match."""
+        return self._submit(_verify, password, hash)
+
+    def metrics(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                'running': self._running,
+                'queued': len(self._waiting),
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'max_concurrent': self.max_concurrent
+            }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+HASHER: HashingQueue | None = None
+
+def openHashingQueue(filename='database.ini') -> HashingQueue:
+    """Create the shared hashing queue, using the optional [hashing] section of the options file for its limits."""
+    global HASHER
+    options = load_options(filename, 'hashing', HASHING_DEFAULTS)
+    HASHER = HashingQueue(int(options['workers']), int(options['max_concurrent']), int(options['max_queued']))
+    return HASHER
\ No newline at end of file
@@ -1,22 +1,94 @@
-from backend.connect import queryData, writeData
+from backend.connect import afterTransaction, prepare, queryData, savepoint, streamData, transaction, writeData
+from config import load_options
 
-from typing import Optional, Union
+from psycopg2 import DatabaseError
+
+from json import dumps, loads
+from os.path import exists
+from threading import Lock
+from time import monotonic
+from typing import Callable, Optional, Union
+
+WRITE_BEHIND_DEFAULTS = {
+    'enabled': "false",
+    'journal': "item_journal",
+    'max_pending': "1024",
+    'flush_interval': "1"
+}
+
+REMOTE_ID = prepare("items_remote_id", "SELECT remote_uid FROM inventories WHERE inventory = %s;")
+INTERNAL_ID = prepare("items_internal_id", "SELECT inventory FROM inventories WHERE remote_uid = %s;")
+INVENTORY_ITEMS = prepare("items_inventory", "SELECT item_id,item_count FROM stored_items WHERE inventory = %s;")
+# The write-behind reads return the flushes recorded for the journal alongside the counts, read in the same snapshot
+FLUSHED = "WITH flushed AS (SELECT COALESCE(array_agg(sequence), '{}') AS sequences FROM write_behind_flushes WHERE journal = %s) "
+INVENTORY_ENTRIES = prepare("items_inventory_entries", FLUSHED + "SELECT flushed.sequences,item_id,item_count,project_id " \
+    "FROM flushed LEFT JOIN stored_items ON stored_items.inventory = %s;")
+BUFFERED_COUNT = prepare("items_buffered_count", FLUSHED + "SELECT flushed.sequences,item_count FROM flushed " \
+    "LEFT JOIN stored_items ON inventory = %s AND item_id = %s AND project_id IS NOT DISTINCT FROM %s;")
+RECORD_FLUSH = prepare("items_record_flush", "INSERT INTO write_behind_flushes(journal,sequence) VALUES(%s,%s);")
+FORGET_FLUSHES = prepare("items_forget_flushes", "DELETE FROM write_behind_flushes WHERE journal = %s AND sequence < %s;")
+JOURNAL_FLUSHES = prepare("items_journal_flushes", "SELECT sequence FROM write_behind_flushes WHERE journal = %s;")
+PROJECT_ITEMS = prepare("items_project", "SELECT item_id,item_count,inventory FROM stored_items WHERE project_id = %s;")
+ITEM_COUNT = prepare("items_count", "SELECT item_count FROM stored_items WHERE inventory = %s AND item_id = %s AND project_id IS NOT DISTINCT FROM %s;")
+# Existing entries take any change, but entries are only created for a positive change, so removing an item that isn't
+# stored leaves no empty row behind. A row created concurrently since the statement's snapshot is caught by ON CONFLICT.
+CHANGE_COUNT = prepare("items_change_count", "WITH changes AS (" \
+    "SELECT %s::integer AS inventory,%s::varchar AS item_id,%s::integer AS delta,%s::integer AS project_id" \
+    "), updated AS (" \
+    "UPDATE stored_items SET item_count = GREATEST(stored_items.item_count + changes.delta, 0) FROM changes " \
+    "WHERE stored_items.inventory = changes.inventory AND stored_items.item_id = changes.item_id " \
+    "AND stored_items.project_id IS NOT DISTINCT FROM changes.project_id " \
+    "RETURNING stored_items.item_count" \
+    "), inserted AS (" \
+    "INSERT INTO stored_items(inventory,item_id,item_count,project_id) " \
+    "SELECT inventory,item_id,delta,project_id FROM changes WHERE delta > 0 AND NOT EXISTS (SELECT 1 FROM updated) " \
+    "ON CONFLICT ON CONSTRAINT unique_entries DO UPDATE SET item_count = GREATEST(stored_items.item_count + EXCLUDED.item_count, 0) " \
+    "RETURNING item_count" \
+    ") SELECT item_count FROM updated UNION ALL SELECT item_count FROM inserted;")
+APPLY_CHANGES = prepare("items_apply_changes", "WITH changes AS (" \
+    "SELECT inventory,item_id,SUM(delta)::integer AS delta,project_id " \
+    "FROM unnest(%s::integer[], %s::varchar[], %s::integer[], %s::integer[]) AS change(inventory,item_id,delta,project_id) " \
+    "GROUP BY inventory,item_id,project_id" \
+    "), updated AS (" \
+    "UPDATE stored_items SET item_count = GREATEST(stored_items.item_count + changes.delta, 0) FROM changes " \
+    "WHERE stored_items.inventory = changes.inventory AND stored_items.item_id = changes.item_id " \
+    "AND stored_items.project_id IS NOT DISTINCT FROM changes.project_id " \
+    "RETURNING stored_items.inventory,stored_items.item_id,stored_items.item_count,stored_items.project_id" \
+    "), inserted AS (" \
+    "INSERT INTO stored_items(inventory,item_id,item_count,project_id) " \
+    "SELECT inventory,item_id,delta,project_id FROM changes WHERE delta > 0 AND NOT EXISTS (" \
+    "SELECT 1 FROM stored_items WHERE stored_items.inventory = changes.inventory AND stored_items.item_id = changes.item_id " \
+    "AND stored_items.project_id IS NOT DISTINCT FROM changes.project_id) " \
+    "ON CONFLICT ON CONSTRAINT unique_entries DO UPDATE SET item_count = GREATEST(stored_items.item_count + EXCLUDED.item_count, 0) " \
+    "RETURNING inventory,item_id,item_count,project_id" \
+    ") SELECT inventory,item_id,item_count,project_id FROM updated " \
+    "UNION ALL SELECT inventory,item_id,item_count,project_id FROM inserted;")
 
 def get_remote_id(connection, internal_id: int) -> str:
     """Get the remote uid of the inventory from the internal id"""
-    return queryData(connection, "SELECT remote_uid FROM inventories WHERE inventory = %s;", internal_id, fetchAll=False)[0]
+    return queryData(connection, REMOTE_ID, internal_id, fetchAll=False)[0]
 
 def get_internal_id(connection, remote_id: str) -> int:
     """Get the internal id of the inventory from the external id"""
-    return int(queryData(connection, "SELECT inventory FROM inventories WHERE remote_uid = %s;", remote_id, fetchAll=False)[0])
+    return int(queryData(connection, INTERNAL_ID, remote_id, fetchAll=False)[0])
 
 def get_items(connection, id: int) -> list[tuple[str, int]]:
-    """Get the items in the inventory, using internal inventory id"""
-    return queryData(connection, "SELECT item_id,item_count FROM stored_items WHERE inventory = %s;", id)
+    """Get the items in the inventory, using internal inventory id. Changes still waiting in the write-behind buffer are included."""
+    if WRITE_BEHIND is None:
+        return queryData(connection, INVENTORY_ITEMS, id)
+    rows = queryData(connection, INVENTORY_ENTRIES, WRITE_BEHIND.journal, id)
+    flushed = rows[0][0]
+    return WRITE_BEHIND.merge(id, [row[1:] for row in rows if row[1] is not None], flushed)
+
+def stream_items(connection, id: int, chunk_size: int = 500):
+    """The same as get_items, but yields the items in lists of at most chunk_size, read through a server-side cursor."""
+    settle(connection)
+    yield from streamData(connection, INVENTORY_ITEMS, id, chunkSize=chunk_size)
 
 def get_items_for_project(connection, project_id: int) -> list[dict[str, Union[str, int]]]:
     """Get all items reserved for the project, and where they're stored."""
-    entries = queryData(connection, "SELECT item_id,item_count,inventory FROM stored_items WHERE project_id = %s;", project_id)
+    settle(connection)
+    entries = queryData(connection, PROJECT_ITEMS, project_id)
     result = []
     for entry in entries:
         item = {}
@@ -30,46 +102,107 @@ def add_inventory(connection, external_id: str):
     """Track an inventory, with its id as the argument"""
     writeData(connection, "INSERT INTO inventories(remote_uid) VALUES(%s);", external_id)
 
-def remove_inventory(connection, external_id: str):
-    """Remove an inventory by external id"""
-    writeData(connection, "DELETE FROM inventories WHERE remote_uid = %s;", external_id)
+def remove_inventory(connection, external_id: str) -> list[tuple[str, int]]:
+    """
+    Remove an inventory by external id, along with everything stored in it.\n
+    Returns the (item_id, project_id) of every reserved entry that was removed.
+    """
+    settle(connection)
+    with transaction(connection):
+        reserved = writeData(connection, "DELETE FROM stored_items USING inventories " \
+        "WHERE stored_items.inventory = inventories.inventory AND remote_uid = %s " \
+        "RETURNING item_id,project_id;", external_id)
+        writeData(connection, "DELETE FROM inventories WHERE remote_uid = %s;", external_id)
+    return [(row[0], row[1]) for row in reserved if row[1] is not None]
+
+def change_item_count(connection, inventory_id: int, item_id: str, delta: int, project_id: Optional[int] = None) -> int:
+    """
+    Change the count of the item in the specified inventory and project by delta, returning the new amount of that item.
+
+    This is a single statement, and the count is clamped at 0 by the database. Removing an item that isn't stored changes nothing.
+    """
+    changed = writeData(connection, CHANGE_COUNT, inventory_id, item_id, delta, project_id)
+    return changed[0][0] if len(changed) != 0 else 0
+
+def apply_item_changes(connection, changes: list[tuple[int, str, int, Optional[int]]]) -> list[tuple[int, str, int, Optional[int]]]:
+    """
+    Apply many count changes at once, given as (inventory, item_id, delta, project_id) entries.
+
+    Deltas for the same entry are summed, and the whole batch is a single statement, so it is applied in one transaction.
+    Counts are clamped at 0, and entries are only created for a positive change.
+    Returns the (inventory, item_id, new count, project_id) of every changed entry.
+    """
+    if len(changes) == 0:
+        return []
+    inventories, item_ids, deltas, project_ids = (list(column) for column in zip(*changes))
+    return writeData(connection, APPLY_CHANGES, inventories, item_ids, deltas, project_ids)
+
+def sync_items(connection, inventory_id: int, snapshot: list[tuple[str, int, Optional[int]]]) -> list[tuple[str, int, Optional[int]]]:
+    """
+    Bring the stored items of the inventory in line with a snapshot of its contents, given as (item_id, count, project_id) entries.
+
+    Only entries whose count differs from the snapshot are written, in a single statement. Entries the snapshot lists
+    with a count of 0 are never created. Unreserved items missing from the snapshot are removed, while reserved items
+    are left alone unless the snapshot lists them.
+    Returns the (item_id, new count, project_id) of every changed entry, with removed entries reported as 0.
+    """
+    settle(connection)
+    item_ids, counts, project_ids = (list(column) for column in zip(*snapshot)) if len(snapshot) != 0 else ([], [], [])
+    return writeData(connection, "WITH snapshot AS (" \
+    "SELECT item_id,GREATEST(SUM(item_count), 0)::integer AS item_count,project_id " \
+    "FROM unnest(%s::varchar[], %s::integer[], %s::integer[]) AS entry(item_id,item_count,project_id) " \
+    "GROUP BY item_id,project_id" \
+    "), changed AS (" \
+    "INSERT INTO stored_items(inventory,item_id,item_count,project_id) " \
+    "SELECT %s,snapshot.item_id,snapshot.item_count,snapshot.project_id FROM snapshot " \
+    "LEFT JOIN stored_items ON stored_items.inventory = %s AND stored_items.item_id = snapshot.item_id " \
+    "AND stored_items.project_id IS NOT DISTINCT FROM snapshot.project_id " \
+    "WHERE stored_items.item_count IS DISTINCT FROM snapshot.item_count " \
+    "AND (stored_items.item_count IS NOT NULL OR snapshot.item_count <> 0) " \
+    "ON CONFLICT ON CONSTRAINT unique_entries DO UPDATE SET item_count = EXCLUDED.item_count " \
+    "RETURNING item_id,item_count,project_id" \
+    "), removed AS (" \
+    "DELETE FROM stored_items WHERE inventory = %s AND project_id IS NULL " \
+    "AND NOT EXISTS (SELECT 1 FROM snapshot WHERE snapshot.item_id = stored_items.item_id AND snapshot.project_id IS NULL) " \
+    "RETURNING item_id,item_count,project_id" \
+    ") SELECT item_id,item_count,project_id FROM changed " \
+    "UNION ALL SELECT item_id,0,project_id FROM removed WHERE item_count <> 0;", 
+    item_ids, counts, project_ids, inventory_id, inventory_id, inventory_id)
+
+def buffer_item_change(connection, inventory_id: int, item_id: str, delta: int, project_id: Optional[int] = None) -> int:
+    """
+    Queue a change to the count of the item in the write-behind buffer, returning the expected new amount of that item.
+
+    The change is journaled immediately, but only written to the database on the next flush.
+    """
+    WRITE_BEHIND.add(inventory_id, item_id, delta, project_id)
+    flushed, stored = queryData(connection, BUFFERED_COUNT, WRITE_BEHIND.journal, inventory_id, item_id, project_id, fetchAll=False)
+    return max(0, (0 if stored is None else stored) + WRITE_BEHIND.unapplied((inventory_id, item_id, project_id), flushed))
 
 def add_item(connection, inventory_id: int, item_id: str, item_qty: int, project_id: Optional[int] = None) -> int:
     """Add a quantity of the item specified to the specified inventory, returning the new amount of that item"""
-    items = get_items(connection, inventory_id)
-
-    for item in items:
-        if item_id == item[0]:
-            qty = item[1]
-            writeData(connection, "UPDATE stored_items SET item_count = %s WHERE inventory = %s AND item_id = %s AND project_id = %s;", 
-                qty+item_qty, inventory_id, item_id, project_id)
-            return qty + item_qty
-    writeData(connection, "INSERT INTO stored_items(inventory,item_id,item_count,project_id) VALUES(%s,%s,%s,%s);", 
-                inventory_id, item_id, item_qty, project_id)
-    return item_qty
+    if WRITE_BEHIND is not None:
+        return buffer_item_change(connection, inventory_id, item_id, int(item_qty), project_id)
+    return change_item_count(connection, inventory_id, item_id, int(item_qty), project_id)
 
 def remove_item(connection, inventory_id: int, item_id: str, item_qty: int, project_id: Optional[int] = None) -> int:
     """Remove a quantity of the item from the specified inventory. If this would reduce the quantity to < 0, it is set to 0 instead."""
-    items = get_items(connection, inventory_id)
-
-    qty = item_qty * -1
-    for item in items:
-        if item_id == item[0]:
-            qty += item[1]
-    
-    if qty < 0:
-        qty = 0
+    if WRITE_BEHIND is not None:
+        return buffer_item_change(connection, inventory_id, item_id, -int(item_qty), project_id)
+    return change_item_count(connection, inventory_id, item_id, -int(item_qty), project_id)
 
-    writeData(connection, "UPDATE stored_items SET item_count = %s WHERE inventory = %s AND item_id = %s AND project_id = %s;", 
-                qty, inventory_id, item_id, project_id)
-    return qty
-
-def delete_item(connection, inventory_id: int, item_id: str, project_id: Optional[int] = None) -> None:
-    """Remove the item from the specified inventory and project."""
+def delete_item(connection, inventory_id: int, item_id: str, project_id: Optional[int] = None) -> list[int]:
+    """
+    Remove the item from the specified inventory and project, or from every project if none is given.\n
+    Returns the ids of the projects it was reserved for.
+    """
+    settle(connection)
     if project_id is None:
-        writeData(connection, "DELETE FROM stored_items WHERE inventory = %s AND item_id = %s;", inventory_id, item_id)
+        removed = writeData(connection, "DELETE FROM stored_items WHERE inventory = %s AND item_id = %s RETURNING project_id;", inventory_id, item_id)
     else:
-        writeData(connection, "DELETE FROM stored_items WHERE inventory = %s AND item_id = %s AND project_id = %s;", inventory_id, item_id, project_id)
+        removed = writeData(connection, "DELETE FROM stored_items WHERE inventory = %s AND item_id = %s AND project_id = %s " \
+        "RETURNING project_id;", inventory_id, item_id, project_id)
+    return [row[0] for row in removed if row[0] is not None]
 
 def transfer_item(connection, 
         item_id: str, 
@@ -84,8 +217,9 @@ def transfer_item(connection,
 
     Returns the number of that item in the source and target inventories.
     """
-    source = remove_item(connection, source_inventory, item_id, transfer_qty, source_project)
-    target = add_item(connection, target_inventory, item_id, transfer_qty, target_project)
+    with transaction(connection):
+        source = remove_item(connection, source_inventory, item_id, transfer_qty, source_project)
+        target = add_item(connection, target_inventory, item_id, transfer_qty, target_project)
     return source, target
 
 def reserve_items(connection, item_id: str, inventory_id: int, target_project: int, reservation_qty: int, source_project: Optional[int] = None) -> tuple[int, int]:
@@ -100,4 +234,208 @@ def unreserve_items(connection, item_id: str, inventory_id: int, project_id: int
     """
     Mark an amount of the item in the inventory that was reserved for the specified project as not reserved for any project.
     """
-    return transfer_item(connection, item_id, inventory_id, inventory_id, qty, project_id)
\ No newline at end of file
+    return transfer_item(connection, item_id, inventory_id, inventory_id, qty, project_id)
+
+
+class WriteBehindBuffer():
+    """
+    Coalesces item count changes in memory and writes them to the database in bulk.
+
+    Changes are summed per (inventory, item_id, project_id) and written with apply_item_changes on each flush. Every
+    change is appended to a local journal before it is acknowledged, and the journal is replayed into the buffer on
+    startup, so changes that were never flushed survive a crash. As the changes are summed, counts are only clamped at
+    0 once per flush.
+
+    Each flush is numbered, marked in the journal after the changes it covers, and recorded in write_behind_flushes in
+    the same transaction that applies them. Replay skips the changes of every recorded flush, so a crash after a flush
+    commits but before the journal is cut down doesn't apply them twice.
+
+    A flush is part of the unit of work open on the connection it is given. Until that ends, its changes still count
+    towards the buffered totals wherever the database doesn't show its flush as recorded yet. If it rolls back, they
+    are queued again.
+
+    A change that can't be applied, such as one to an inventory or project deleted since it was buffered, is dropped
+    and passed to on_dropped along with the error, rather than failing the rest of its flush.
+    """
+    def __init__(self, journal: str, max_pending: int, flush_interval: float):
+        self.journal = journal
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self.on_full: Callable[[], None] | None = None
+        self.on_dropped: Callable[[tuple[int, str, int, int | None], Exception], None] | None = None
+
+        self._pending: dict[tuple[int, str, int | None], int] = {}
+        self._in_flight: dict[int, dict[tuple[int, str, int | None], int]] = {}
+        self._sequence = 1
+        self._oldest: float | None = None
+        self._flush_requested = False
+        self._lock = Lock()
+        self._journal = None
+
+    def start(self, connection) -> None:
+        """Replay the journal into the buffer, then cut it down to the changes that still need to be flushed."""
+        with self._lock:
+            self._replay(connection)
+            self._journal = open(self.journal, "a")
+            self._rewrite()
+
+    def _replay(self, connection) -> None:
+        flushed = {row[0] for row in queryData(connection, JOURNAL_FLUSHES, self.journal)}
+        self._sequence = max(flushed, default=0) + 1
+        if not exists(self.journal):
+            return
+        batch = {}
+        with open(self.journal) as journal:
+            for line in journal:
+                try:
+                    entry = loads(line)
+                except ValueError: # A line cut short by a crash
+                    continue
+                if isinstance(entry, dict): # The end of the changes covered by a flush
+                    self._sequence = max(self._sequence, entry['flushed'] + 1)
+                    if entry['flushed'] not in flushed:
+                        self._queue(batch)
+                    batch = {}
+                    continue
+                inventory, item_id, delta, project_id = entry
+                key = (inventory, item_id, project_id)
+                batch[key] = batch.get(key, 0) + delta
+        self._queue(batch)
+        if len(self._pending) != 0:
+            self._oldest = monotonic()
+
+    def _queue(self, changes: dict[tuple[int, str, int | None], int]) -> None:
+        for key, delta in changes.items():
+            self._pending[key] = self._pending.get(key, 0) + delta
+
+    def _rewrite(self) -> None:
+        """Cut the journal down to the flushes still in flight, followed by the waiting changes. The lock must be held."""
+        self._journal.truncate(0)
+        for sequence, changes in self._in_flight.items():
+            for key, delta in changes.items():
+                self._journal.write(dumps([key[0], key[1], delta, key[2]]) + "\n")
+            self._journal.write(dumps({'flushed': sequence}) + "\n")
+        for key, delta in self._pending.items():
+            self._journal.write(dumps([key[0], key[1], delta, key[2]]) + "\n")
+        self._journal.flush()
+
+    def add(self, inventory: int, item_id: str, delta: int, project_id: int | None) -> None:
+        """Queue a change."""
+        key = (inventory, item_id, project_id)
+        with self._lock:
+            self._journal.write(dumps([inventory, item_id, delta, project_id]) + "\n")
+            self._journal.flush()
+            self._pending[key] = self._pending.get(key, 0) + delta
+            if self._oldest is None:
+                self._oldest = monotonic()
+            full = len(self._pending) >= self.max_pending and not self._flush_requested
+            self._flush_requested = self._flush_requested or full
+        if full and self.on_full is not None:
+            self.on_full()
+
+    def unapplied(self, key: tuple[int, str, int | None], flushed: list[int]) -> int:
+        """The total change for the entry that isn't in the database yet, given the flushes it has recorded."""
+        with self._lock:
+            return self._pending.get(key, 0) + sum(changes.get(key, 0) for sequence, changes in self._in_flight.items()
+                                                   if sequence not in flushed)
+
+    def merge(self, inventory: int, rows: list[tuple[str, int, int | None]], flushed: list[int]) -> list[tuple[str, int]]:
+        """Apply the changes for the inventory that aren't in the database yet to its (item_id, count, project_id) rows."""
+        pending = {}
+        with self._lock:
+            for changes in [changes for sequence, changes in self._in_flight.items() if sequence not in flushed] + [self._pending]:
+                for key, delta in changes.items():
+                    if key[0] == inventory:
+                        pending[(key[1], key[2])] = pending.get((key[1], key[2]), 0) + delta
+        items = []
+        for item_id, count, project_id in rows:
+            items.append((item_id, max(0, count + pending.pop((item_id, project_id), 0))))
+        for key, delta in pending.items():
+            items.append((key[0], max(0, delta)))
+        return items
+
+    def due(self) -> bool:
+        with self._lock:
+            return self._oldest is not None and (len(self._pending) >= self.max_pending or monotonic() - self._oldest >= self.flush_interval)
+
+    def flush(self, connection) -> int:
+        """Write every waiting change to the database, returning the number of entries written."""
+        with self._lock:
+            if len(self._pending) == 0:
+                return 0
+            flushed, self._pending = self._pending, {}
+            sequence = self._sequence
+            self._sequence += 1
+            self._in_flight[sequence] = flushed
+            self._journal.write(dumps({'flushed': sequence}) + "\n")
+            self._journal.flush()
+            # Flushes that are no longer in flight have already been cut from the journal, so their records aren't needed
+            oldest = min(self._in_flight)
+            self._oldest = None
+            self._flush_requested = False
+        changes = [(key[0], key[1], delta, key[2]) for key, delta in flushed.items() if delta != 0]
+        with transaction(connection):
+            afterTransaction(connection, lambda committed: self._settle(sequence, committed))
+            writeData(connection, RECORD_FLUSH, self.journal, sequence)
+            writeData(connection, FORGET_FLUSHES, self.journal, oldest)
+            written = self._apply(connection, sequence, changes)
+        return written
+
+    def _apply(self, connection, sequence: int, changes: list[tuple[int, str, int, int | None]]) -> int:
+        """
+        Apply the changes of a flush in a single statement. If any of them fails, each is applied on its own instead, and
+        those that still fail are dropped from the flush. Returns the number of changes applied.
+        """
+        if len(changes) == 0:
+            return 0
+        try:
+            with savepoint(connection, "sgu_flush"):
+                apply_item_changes(connection, changes)
+            return len(changes)
+        except DatabaseError:
+            pass
+        written = 0
+        for change in changes:
+            try:
+                with savepoint(connection, "sgu_flush_change"):
+                    apply_item_changes(connection, [change])
+                written += 1
+            except DatabaseError as error:
+                with self._lock:
+                    self._in_flight[sequence].pop((change[0], change[1], change[3]), None)
+                if self.on_dropped is not None:
+                    self.on_dropped(change, error)
+        return written
+
+    def _settle(self, sequence: int, committed: bool) -> None:
+        with self._lock:
+            flushed = self._in_flight.pop(sequence)
+            if not committed:
+                self._queue(flushed)
+                if len(self._pending) != 0 and self._oldest is None:
+                    self._oldest = monotonic()
+            self._rewrite()
+
+    def close(self) -> None:
+        if self._journal is not None:
+            self._journal.close()
+
+
+WRITE_BEHIND: WriteBehindBuffer | None = None
+
+def openWriteBehind(filename='database.ini') -> WriteBehindBuffer | None:
+    """
+    Create the write-behind buffer if it is enabled in the optional [write_behind] section of the options file.\n
+    Its journal is only replayed once the buffer is started.
+    """
+    global WRITE_BEHIND
+    options = load_options(filename, 'write_behind', WRITE_BEHIND_DEFAULTS)
+    if options['enabled'].lower() not in ("true", "yes", "1"):
+        return None
+    WRITE_BEHIND = WriteBehindBuffer(options['journal'], int(options['max_pending']), float(options['flush_interval']))
+    return WRITE_BEHIND
+
+def settle(connection) -> None:
+    """Flush the write-behind buffer, if there is one, so that statements which don't merge waiting changes see them."""
+    if WRITE_BEHIND is not None:
+        WRITE_BEHIND.flush(connection)
\ No newline at end of file
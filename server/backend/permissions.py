@@ -0,0 +1,54 @@
+from backend.connect import Statement, prepare, queryData
+from utils import LRUCache, MISSING
+
+# Cached results of permission checks, keyed by (check, group or project id, uuid)
+PERMISSION_CACHE_SIZE = 8192
+_permissions = LRUCache(PERMISSION_CACHE_SIZE)
+
+OWNS_GROUP = prepare("permissions_owns_group", "SELECT EXISTS(SELECT 1 FROM groups WHERE group_id = %s AND owner_uuid = %s);")
+IS_GROUP_MEMBER = prepare("permissions_group_member", "SELECT EXISTS(SELECT 1 FROM group_relations WHERE group_id = %s AND uuid = %s);")
+OWNS_PROJECT = prepare("permissions_owns_project", "SELECT EXISTS(SELECT 1 FROM projects WHERE project_id = %s AND owner_uuid = %s);")
+CAN_ACCESS_PROJECT = prepare("permissions_project_access", "SELECT EXISTS(SELECT 1 FROM projects WHERE project_id = %s AND (scope = 'PUBLIC' OR owner_uuid = %s OR " \
+    "(scope = 'GROUP' AND EXISTS(SELECT 1 FROM group_relations WHERE group_relations.group_id = projects.group_id AND uuid = %s))));")
+
+def _check(connection, key: tuple[str, int, str], query: Statement, *args) -> bool:
+    # Read before querying, so a check that raced a change committing and being invalidated isn't cached
+    generation = _permissions.generation
+    allowed = _permissions.get(key)
+    if allowed is MISSING:
+        allowed = queryData(connection, query, *args, fetchAll=False)[0]
+        _permissions.put(key, allowed, generation)
+    return allowed
+
+def owns_group(connection, uuid: str, group_id: int) -> bool:
+    """Check if the user owns the group."""
+    group_id = int(group_id)
+    return _check(connection, ("group-owner", group_id, uuid), OWNS_GROUP, group_id, uuid)
+
+def is_group_member(connection, uuid: str, group_id: int) -> bool:
+    """Check if the user is a member of the group."""
+    group_id = int(group_id)
+    return _check(connection, ("group-member", group_id, uuid), IS_GROUP_MEMBER, group_id, uuid)
+
+def owns_project(connection, uuid: str, project_id: int) -> bool:
+    """Check if the user owns the project."""
+    project_id = int(project_id)
+    return _check(connection, ("project-owner", project_id, uuid), OWNS_PROJECT, project_id, uuid)
+
+def can_access_project(connection, uuid: str, project_id: int) -> bool:
+    """Check if the project is visible to the user, either as its owner, through its group, or because it is public."""
+    project_id = int(project_id)
+    return _check(connection, ("project-member", project_id, uuid), CAN_ACCESS_PROJECT, project_id, uuid, uuid)
+
+def invalidate_group(group_id: int) -> None:
+    """Drop cached checks affected by a change to the group's owner or members, including access to its projects."""
+    group_id = int(group_id)
+    _permissions.invalidate_where(lambda key: (key[0].startswith("group") and key[1] == group_id) or key[0] == "project-member")
+
+def invalidate_project(project_id: int) -> None:
+    """Drop cached checks affected by a change to the project's owner or scope."""
+    project_id = int(project_id)
+    _permissions.invalidate_where(lambda key: key[0].startswith("project") and key[1] == project_id)
+
+def permission_stats() -> dict[str, int]:
+    return _permissions.stats()
\ No newline at end of file
@@ -1,5 +1,6 @@
-from backend.connect import queryData, writeData
-from backend.items import get_items_for_project, unreserve_items
+from backend.connect import invalidateAfter, prepare, queryData, streamData, transaction, writeData
+from backend.items import get_items_for_project, settle, unreserve_items
+from backend.permissions import invalidate_project
 
 from enum import StrEnum
 from typing import Optional
@@ -9,23 +10,36 @@ class Scope(StrEnum):
     GROUP = "GROUP"
     PRIVATE = "PRIVATE"
 
-
-def get_projects(connection, uuid: str) -> list[tuple[int, str, str, str]]:
+VISIBLE_PROJECTS = prepare("projects_visible", "SELECT project_id,project_name,project_desc,scope FROM projects " \
+    "WHERE project_id > %s AND (scope = 'PUBLIC' OR owner_uuid = %s OR (scope = 'GROUP' AND EXISTS(" \
+    "SELECT 1 FROM group_relations WHERE group_relations.group_id = projects.group_id AND uuid = %s))) " \
+    "ORDER BY project_id LIMIT %s;")
+PROJECTS_GROUPS = prepare("projects_groups", "SELECT project_id,group_id FROM projects WHERE project_id = ANY(%s::integer[]);")
+PROJECT_DETAILS = prepare("projects_details", "SELECT " \
+    "(SELECT COALESCE(json_object_agg(item_id, goal_quantity), '{}') FROM project_goals WHERE project_id = %s), " \
+    "(SELECT COALESCE(json_agg(json_build_object('id', item_id, 'count', item_count, 'inventory', remote_uid)), '[]') " \
+    "FROM stored_items JOIN inventories ON stored_items.inventory = inventories.inventory WHERE project_id = %s), " \
+    "(SELECT COALESCE(json_object_agg(project_goals.item_id, json_build_object('goal', goal_quantity, 'gathered', COALESCE(gathered, 0))), '{}') " \
+    "FROM project_goals LEFT JOIN project_progress " \
+    "ON project_goals.project_id = project_progress.project_id AND project_goals.item_id = project_progress.item_id " \
+    "WHERE project_goals.project_id = %s);")
+PROJECT_PROGRESS = prepare("projects_progress", "SELECT project_goals.item_id,goal_quantity,COALESCE(gathered, 0) " \
+    "FROM project_goals LEFT JOIN project_progress " \
+    "ON project_goals.project_id = project_progress.project_id AND project_goals.item_id = project_progress.item_id " \
+    "WHERE project_goals.project_id = %s AND (%s::varchar[] IS NULL OR project_goals.item_id = ANY(%s::varchar[]));")
+
+
+def get_projects(connection, uuid: str, after_id: int = 0, limit: Optional[int] = None) -> list[tuple[int, str, str, str]]:
     """
-        Get the projects visible for the user specified by uuid.\n
+        Get the projects visible for the user specified by uuid, ordered by project id.\n
+        Only projects with an id greater than after_id are included, and at most limit of them if it is given.\n
         Returns a list of tuples containing project id, name, description, and scope.
     """
-    simple_project_list = queryData(connection, "SELECT project_id,project_name,project_desc,scope FROM projects " \
-    "WHERE SCOPE = 'PUBLIC' OR owner_uuid = %s;", uuid)
-
-    group_project_list = queryData(connection, "SELECT project_id,project_name,project_desc,scope FROM projects " \
-    "LEFT JOIN group_relations ON projects.group_id = group_relations.group_id " \
-    "WHERE SCOPE = 'GROUP' AND uuid = %s;", uuid)
+    return queryData(connection, VISIBLE_PROJECTS, after_id, uuid, uuid, limit)
 
-    projects = [project for project in simple_project_list if project not in group_project_list]
-    projects.extend(group_project_list)
-    projects.sort(key=lambda x: x[0])
-    return projects
+def stream_projects(connection, uuid: str, after_id: int = 0, limit: Optional[int] = None, chunk_size: int = 500):
+    """The same as get_projects, but yields the projects in lists of at most chunk_size, read through a server-side cursor."""
+    yield from streamData(connection, VISIBLE_PROJECTS, after_id, uuid, uuid, limit, chunkSize=chunk_size)
 
 def get_owned_projects(connection, uuid: str) -> list[int]:
     """
@@ -40,15 +54,15 @@ def get_project_group(connection, id: int) -> int:
     return int(queryData(connection, "SELECT group_id FROM projects WHERE project_id = %s;", id, fetchAll=False)[0])
 
 def get_projects_groups(connection, ids: list[int]) -> dict[int, int]:
-    """Get the mapping of project id to group ids for the specified project ids."""
+    """
+    Get the mapping of project id to group ids for the specified project ids.\n
+    The ids are sent as a single array parameter, so this is one statement however many ids are given.
+    Projects without a group map to None.
+    """
     mapping = {}
-    queryFilter = "WHERE project_id = " + str(ids[0])
-    if len(ids) > 1:
-        for id in ids:
-            queryFilter += " OR project_id = " + str(id)
-    maps = queryData(connection, "SELECT project_id,group_id FROM PROJECTS " + queryFilter + ";")
+    maps = queryData(connection, PROJECTS_GROUPS, [int(id) for id in ids])
     for map in maps:
-        mapping[int(map[0])] = int(map[1])
+        mapping[int(map[0])] = None if map[1] is None else int(map[1])
 
     return mapping
 
@@ -60,30 +74,74 @@ def get_project_goal(connection, id: int) -> dict[str, int]:
         mapping[item[0]] = int(item[1])
     return mapping
 
+def get_project_details(connection, id: int) -> tuple[dict[str, int], list[dict[str, str | int]], dict[str, dict[str, int]]]:
+    """
+    Get everything needed to show the specified project, in a single query:\n
+    the mapping of items to their goal amounts, the reserved items along with the remote ids of the inventories they're stored in,
+    and a mapping of each goal item to its goal and gathered amounts.
+    """
+    settle(connection)
+    return queryData(connection, PROJECT_DETAILS, id, id, id, fetchAll=False)
+
+def get_progress(connection, id: int, item_ids: Optional[list[str]] = None) -> dict[str, dict[str, int]]:
+    """
+    Get the goal and gathered amounts of the specified goal items of the project, from the maintained progress totals.\n
+    Every goal item is included if no item ids are given.
+    """
+    mapping = {}
+    settle(connection)
+    rows = queryData(connection, PROJECT_PROGRESS, id, item_ids, item_ids)
+    for row in rows:
+        mapping[row[0]] = {'goal': int(row[1]), 'gathered': int(row[2])}
+    return mapping
+
+def check_progress(connection) -> list[tuple[int, str, int, int]]:
+    """
+    Compare the maintained project progress totals against totals recomputed from stored_items.\n
+    Returns the project id, item id, recorded total and recomputed total of every entry that differs.
+    """
+    return queryData(connection, "SELECT COALESCE(recorded.project_id, actual.project_id),COALESCE(recorded.item_id, actual.item_id)," \
+    "COALESCE(recorded.gathered, 0),COALESCE(actual.gathered, 0) " \
+    "FROM project_progress AS recorded FULL OUTER JOIN (" \
+    "SELECT project_id,item_id,SUM(item_count) AS gathered FROM stored_items WHERE project_id IS NOT NULL GROUP BY project_id,item_id" \
+    ") AS actual ON recorded.project_id = actual.project_id AND recorded.item_id = actual.item_id " \
+    "WHERE COALESCE(recorded.gathered, 0) <> COALESCE(actual.gathered, 0);")
+
+def rebuild_progress(connection) -> None:
+    """Recompute every project progress total from stored_items."""
+    writeData(connection, "DELETE FROM project_progress;" \
+    "INSERT INTO project_progress(project_id,item_id,gathered) " \
+    "SELECT project_id,item_id,SUM(item_count) FROM stored_items WHERE project_id IS NOT NULL GROUP BY project_id,item_id;")
+
 
 def create_project(connection, uuid: str, name: str, scope: Scope, desc: Optional[str] = None, group_id: Optional[int] = None):
     """Create a project with the specified information. If the scope is Group, group_id must be provided"""
     if scope == Scope.GROUP and group_id is None: return
 
-    writeData(connection, "INSERT INTO projects(owner_uuid,project_name,project_desc,scope,group_id) "
-    "VALUES (%s,%s,%s,%s,%s)", uuid, name, desc, scope, group_id)
+    project_id = writeData(connection, "INSERT INTO projects(owner_uuid,project_name,project_desc,scope,group_id) "
+    "VALUES (%s,%s,%s,%s,%s) RETURNING project_id;", uuid, name, desc, scope, group_id)[0][0]
+    invalidateAfter(connection, invalidate_project, project_id)
 
 def delete_project(connection, project_id: int):
     """Delete the specified project. This should only be allowed to be done by the project owner. This also unreserves all items reserved for that project."""
-    items = get_items_for_project(connection, project_id)
-    for item in items:
-        unreserve_items(connection, item['id'], item['inventory'], project_id, item['count'])
-    writeData(connection, "DELETE FROM projects WHERE project_id = %s;", project_id)
+    with transaction(connection):
+        items = get_items_for_project(connection, project_id)
+        for item in items:
+            unreserve_items(connection, item['id'], item['inventory'], project_id, item['count'])
+        writeData(connection, "DELETE FROM projects WHERE project_id = %s;", project_id)
+        invalidateAfter(connection, invalidate_project, project_id)
 
 def transfer_project(connection, project_id: int, new_owner_uuid: str):
     """Tranfer ownership of the specified project to the specified user."""
     writeData(connection, "UPDATE projects SET owner_uuid = %s WHERE project_id = %s;", new_owner_uuid, project_id)
+    invalidateAfter(connection, invalidate_project, project_id)
 
 def change_scope(connection, project_id: int, new_scope: Scope, group_id: Optional[int] = None):
     """Change the scope of the specified project. If changed to Group, group_id must be provided"""
     if new_scope == Scope.GROUP and group_id is None: return
 
     writeData(connection, "UPDATE projects SET scope = %s,group_id = %s WHERE project_id = %s;", new_scope, group_id, project_id)
+    invalidateAfter(connection, invalidate_project, project_id)
 
 def add_item(connection, project_id: int, item_id: str, quantity: int):
     """Add an item to the project to be tracked"""
@@ -0,0 +1,82 @@
+"""
+Compare the old string-built OR chains with the = ANY(%s) array lookups in groups.get_groups_info and projects.get_projects_groups.
+
+Run from the server directory with: python -m benchmarks.bulk_lookup [rounds]
+Everything is done in temporary tables that shadow the real ones, so the real groups and projects are left untouched.
+"""
+import sys
+from time import perf_counter
+
+from backend.connect import openConnection, queryData, writeData
+from backend.groups import get_groups_info
+from backend.projects import get_projects_groups
+
+ROUNDS = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+SIZES = [10, 1_000, 10_000]
+ROWS = 20_000
+
+def timed(name: str, fn) -> float:
+    start = perf_counter()
+    for i in range(ROUNDS):
+        fn()
+    elapsed = (perf_counter() - start) / ROUNDS * 1000
+    print(f"{name:<40}{elapsed:>12.3f} ms/call")
+    return elapsed
+
+def or_chain(column: str, ids: list[int]) -> str:
+    """The filter the lookups used to build, including its duplicated first id."""
+    queryFilter = f"WHERE {column} = " + str(ids[0])
+    for id in ids:
+        queryFilter += f" OR {column} = " + str(id)
+    return queryFilter
+
+def old_groups_info(ids: list[int]) -> None:
+    queryFilter = or_chain("group_id", ids)
+    queryData(connection, "SELECT group_id,group_name,owner_uuid,username FROM groups " \
+        "LEFT JOIN users ON groups.owner_uuid = users.useruuid " + queryFilter + ";")
+    queryData(connection, "SELECT group_id,useruuid,username FROM group_relations " \
+        "LEFT JOIN users ON group_relations.uuid = users.useruuid " + queryFilter + ";")
+
+def old_projects_groups(ids: list[int]) -> None:
+    queryData(connection, "SELECT project_id,group_id FROM projects " + or_chain("project_id", ids) + ";")
+
+if __name__ == "__main__":
+    connection = openConnection()
+    writeData(connection,
+        "CREATE TEMP TABLE users(" \
+        "useruuid VARCHAR(64) PRIMARY KEY," \
+        "username VARCHAR(16) NOT NULL" \
+        ");" \
+        "CREATE TEMP TABLE groups(" \
+        "group_id SERIAL PRIMARY KEY," \
+        "group_name VARCHAR(16) NOT NULL," \
+        "owner_uuid VARCHAR(64) NOT NULL" \
+        ");" \
+        "CREATE TEMP TABLE group_relations(" \
+        "group_id INTEGER NOT NULL," \
+        "uuid VARCHAR(64) NOT NULL," \
+        "PRIMARY KEY(group_id,uuid)" \
+        ");" \
+        "CREATE TEMP TABLE projects(" \
+        "project_id SERIAL PRIMARY KEY," \
+        "group_id INTEGER" \
+        ");" \
+        "INSERT INTO users SELECT 'user' || n, 'Player' || n FROM generate_series(1, %s) AS n;" \
+        "INSERT INTO groups(group_name,owner_uuid) SELECT 'Group' || n, 'user' || n FROM generate_series(1, %s) AS n;" \
+        "INSERT INTO group_relations SELECT group_id, owner_uuid FROM groups;" \
+        "INSERT INTO projects(group_id) SELECT n FROM generate_series(1, %s) AS n;" \
+        "ANALYZE users; ANALYZE groups; ANALYZE group_relations; ANALYZE projects;", ROWS, ROWS, ROWS
+    )
+    print(f"{ROWS} groups and projects, {ROUNDS} calls each")
+
+    for size in SIZES:
+        ids = list(range(1, ROWS + 1, ROWS // size))[:size]
+        print(f"\n{size} ids")
+        old = timed("get_groups_info (OR chain)", lambda: old_groups_info(ids))
+        new = timed("get_groups_info (ANY)", lambda: get_groups_info(connection, ids))
+        print(f"{'':<40}{old / new:>12.1f}x faster")
+        old = timed("get_projects_groups (OR chain)", lambda: old_projects_groups(ids))
+        new = timed("get_projects_groups (ANY)", lambda: get_projects_groups(connection, ids))
+        print(f"{'':<40}{old / new:>12.1f}x faster")
+
+    connection.close()
@@ -0,0 +1,79 @@
+"""
+Compare the old per-message decode, field check and encode with the codec and compiled schema path, then the size and
+encoding time of a stream of item updates in JSON and in the binary protocol.
+
+Run from the server directory with: python -m benchmarks.codec [rounds]
+No database is needed. The fast codec is only timed if orjson is installed, and the binary protocol if msgpack is.
+"""
+import sys
+from json import dumps, loads
+from time import perf_counter
+
+from backend.auth import data_present
+from utils import Schema
+from utils.wire import JsonCodec, MsgpackCodec, msgpack, orjson
+
+ROUNDS = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+TYPES = {'project_id': int, 'target_project_id': int, 'source_project_id': int, 'item_qty': int}
+
+# The same fields as the matching SGUMsgType entries
+MESSAGES = {
+    "item-add": (['type', 'external_id', 'item_id', 'item_qty'],
+        {'type': "item-add", 'external_id': "chest-12", 'item_id': "minecraft:oak_log&17", 'item_qty': "64"}),
+    "project-item-reserve": (['type', 'target_project_id', 'item_id', 'item_qty', 'external_id', 'source_project_id'],
+        {'type': "project-item-reserve", 'target_project_id': "4", 'item_id': "minecraft:oak_log&17", 'item_qty': 32,
+         'external_id': "chest-12", 'source_project_id': -1}),
+    "item-batch": (['type', 'external_id', 'items'],
+        {'type': "item-batch", 'external_id': "chest-12", 'items': [[f"minecraft:item_{n}&{n}", n, -1] for n in range(50)]})
+}
+REPLY = {'type': "item-info", 'items': [(f"minecraft:item_{n}&{n}", n) for n in range(50)], 'inventory': "chest-12"}
+# Item updates cycling through a few hundred item ids, as a busy client sees them
+UPDATES = [{'type': "item-info", 'items': [(f"minecraft:item_{(n + i) % 300}&{(n + i) % 300}", n) for i in range(5)], 'inventory': "chest-12"}
+    for n in range(1000)]
+
+def timed(name: str, fn) -> float:
+    start = perf_counter()
+    for i in range(ROUNDS):
+        fn()
+    elapsed = (perf_counter() - start) / ROUNDS * 1_000_000
+    print(f"{name:<40}{elapsed:>10.2f} us/message")
+    return elapsed
+
+def old_path(data: bytes, fields: list[str]) -> bytes:
+    payload = loads(data.decode('utf-8'))
+    data_present(payload, ['type'])
+    data_present(payload, fields)
+    return bytes(dumps(REPLY), 'utf-8')
+
+def new_path(codec: JsonCodec, schema: Schema, data: bytes) -> bytes:
+    payload = codec.decode(data)
+    schema.validate(payload)
+    return codec.encode(REPLY)
+
+if __name__ == "__main__":
+    codecs = {"stdlib codec": JsonCodec(fast=False)}
+    if orjson is not None:
+        codecs["orjson codec"] = JsonCodec()
+    print(f"{ROUNDS} messages each, decoding and validating the message, then encoding a 50 item reply")
+
+    for name, (fields, message) in MESSAGES.items():
+        data = dumps(message).encode()
+        schema = Schema(fields, TYPES)
+        print(f"\n{name}")
+        old = timed("old path", lambda: old_path(data, fields))
+        for codec_name, codec in codecs.items():
+            new = timed(codec_name, lambda: new_path(codec, schema, data))
+            print(f"{'':<40}{old / new:>10.1f}x faster")
+
+    print(f"\n{len(UPDATES)} item updates of 5 items each, {max(ROUNDS // len(UPDATES), 1)} times over")
+    streams = dict(codecs)
+    if msgpack is not None:
+        streams["MessagePack codec, interned"] = None
+    for name, codec in streams.items():
+        start = perf_counter()
+        for i in range(max(ROUNDS // len(UPDATES), 1)):
+            # Interning is per connection, so every pass is a fresh connection
+            stream = codec or MsgpackCodec()
+            sent = sum(len(stream.encode(update)) for update in UPDATES)
+        elapsed = (perf_counter() - start) / (max(ROUNDS // len(UPDATES), 1) * len(UPDATES)) * 1_000_000
+        print(f"{name:<40}{elapsed:>10.2f} us/update{sent / len(UPDATES):>10.1f} bytes/update")
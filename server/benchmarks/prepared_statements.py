@@ -0,0 +1,60 @@
+"""
+Compare sending the full query text with executing the named prepared statements on the hot item paths.
+
+Run from the server directory with: python -m benchmarks.prepared_statements [rounds]
+Everything is done in temporary tables that shadow the real ones, so the real items are left untouched.
+"""
+import sys
+from time import perf_counter
+
+from backend.connect import openConnection, queryData, writeData
+from backend.items import CHANGE_COUNT, INTERNAL_ID, INVENTORY_ITEMS, ITEM_COUNT
+
+ROUNDS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+INVENTORIES = 1000
+ITEMS = 50
+
+def timed(name: str, fn) -> float:
+    start = perf_counter()
+    for i in range(ROUNDS):
+        fn(i)
+    elapsed = (perf_counter() - start) / ROUNDS * 1_000_000
+    print(f"{name:<32}{elapsed:>10.1f} us/call")
+    return elapsed
+
+def compare(name: str, run, statement, args) -> None:
+    text = timed(f"{name} (text)", lambda i: run(connection, statement.query, *args(i)))
+    prepared = timed(f"{name} (prepared)", lambda i: run(connection, statement, *args(i)))
+    print(f"{'':<32}{text - prepared:>10.1f} us saved per call")
+
+if __name__ == "__main__":
+    connection = openConnection()
+    writeData(connection,
+        "CREATE TEMP TABLE inventories(" \
+        "inventory SERIAL PRIMARY KEY," \
+        "remote_uid VARCHAR(64) NOT NULL" \
+        ");" \
+        "CREATE TEMP TABLE stored_items(" \
+        "inventory INTEGER NOT NULL," \
+        "item_id VARCHAR(64) NOT NULL," \
+        "item_count INTEGER DEFAULT 0," \
+        "project_id INTEGER," \
+        "CONSTRAINT unique_entries UNIQUE NULLS NOT DISTINCT (inventory,item_id,project_id)" \
+        ");" \
+        "CREATE INDEX ON inventories (remote_uid);" \
+        "INSERT INTO inventories(remote_uid) SELECT 'inv' || n FROM generate_series(1, %s) AS n;" \
+        "INSERT INTO stored_items SELECT inventory, 'item' || n, n, NULL FROM inventories, generate_series(1, %s) AS n;" \
+        "ANALYZE inventories; ANALYZE stored_items;", INVENTORIES, ITEMS
+    )
+    print(f"{INVENTORIES} inventories of {ITEMS} items, {ROUNDS} calls each")
+
+    compare("get_internal_id", lambda *args: queryData(*args, fetchAll=False), INTERNAL_ID,
+        lambda i: (f"inv{i % INVENTORIES + 1}",))
+    compare("get_items", queryData, INVENTORY_ITEMS,
+        lambda i: (i % INVENTORIES + 1,))
+    compare("buffer_item_change lookup", lambda *args: queryData(*args, fetchAll=False), ITEM_COUNT,
+        lambda i: (i % INVENTORIES + 1, f"item{i % ITEMS + 1}", None))
+    compare("change_item_count", writeData, CHANGE_COUNT,
+        lambda i: (i % INVENTORIES + 1, f"item{i % ITEMS + 1}", 1, None))
+
+    connection.close()
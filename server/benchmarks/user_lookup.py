@@ -0,0 +1,58 @@
+"""
+Compare the old full-table username/uuid scans with the lookups in backend.auth, with and without the directory cache.
+
+Run from the server directory with: python -m benchmarks.user_lookup [users]
+Everything is done in a temporary users table that shadows the real one, so the real users are left untouched.
+"""
+import sys
+from time import perf_counter
+
+from backend import auth
+from backend.connect import openConnection, queryData, writeData
+
+USERS = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+ROUNDS = 50
+
+def timed(name: str, fn) -> float:
+    start = perf_counter()
+    for i in range(ROUNDS):
+        fn(i)
+    elapsed = (perf_counter() - start) / ROUNDS * 1000
+    print(f"{name:<32}{elapsed:>10.3f} ms/call")
+    return elapsed
+
+def username(i: int) -> str:
+    return f"Player{(i * 7919) % USERS}"
+
+def username_exists_uncached(i: int) -> bool:
+    auth.invalidate_user(None, username(i))
+    return auth.username_exists(connection, username(i))
+
+if __name__ == "__main__":
+    connection = openConnection()
+    writeData(connection,
+        "CREATE TEMP TABLE users(" \
+        "useruuid VARCHAR(64) PRIMARY KEY," \
+        "username VARCHAR(16) NOT NULL," \
+        "password VARCHAR(128) NOT NULL" \
+        ");" \
+        "INSERT INTO users SELECT md5(n::text) || md5((-n)::text), 'Player' || n, '' FROM generate_series(0, %s) AS n;" \
+        "CREATE UNIQUE INDEX ON users (lower(username));" \
+        "ANALYZE users;", USERS - 1
+    )
+    print(f"{USERS} users, {ROUNDS} lookups each")
+
+    old = timed("username_exists (scan)", lambda i: username(i).lower() in
+        [user[0].lower() for user in queryData(connection, "SELECT username FROM users;")])
+    new = timed("username_exists (index)", username_exists_uncached)
+    print(f"{'':<32}{old / new:>10.1f}x faster")
+    cached = timed("username_exists (cached)", lambda i: auth.username_exists(connection, username(i)))
+    print(f"{'':<32}{old / cached:>10.1f}x faster")
+
+    # Misses aren't cached, so every lookup of a missing uuid reaches the database
+    old = timed("user_exists (scan)", lambda i: "missing" in
+        [uid[0] for uid in queryData(connection, "SELECT useruuid FROM users;")])
+    new = timed("user_exists (index)", lambda i: auth.user_exists(connection, "missing"))
+    print(f"{'':<32}{old / new:>10.1f}x faster")
+
+    connection.close()
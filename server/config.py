@@ -13,4 +13,16 @@ def load_config(filename='database.ini', section='postgresql'):
     else:
         raise Exception('Section {0} not found in the {1} file'.format(section, filename))
     
-    return config
\ No newline at end of file
+    return config
+
+def load_options(filename='database.ini', section='pool', defaults: dict[str, str] | None = None) -> dict[str, str]:
+    """Read an optional section of the options file, falling back to the provided defaults for anything not set."""
+    parser = ConfigParser()
+    parser.read(filename)
+
+    options = dict(defaults) if defaults is not None else {}
+    if parser.has_section(section):
+        for param in parser.items(section):
+            options[param[0]] = param[1]
+
+    return options
\ No newline at end of file
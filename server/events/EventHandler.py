@@ -1,32 +1,64 @@
-from json import dumps
-from picows import WSMsgType
+import asyncio
+from typing import Callable
 
-from backend import auth
+from backend import auth, permissions
+from backend.connect import afterTransaction, lease, leasedConnection
 from globals import *
 from events.Events import *
-from events.SGUMsgType import find_event_type, find_type
+from events.SGUMsgType import MessageRoute, SGUMsgType
 
 
 def handleEvent(event: Event) -> int:
-    event = HOOK_REGISTRY[event.type].resolve(event)
-    if event is int: return event 
-    return RESOLUTION_REGISTRY[event.type](event)
+    with lease():
+        return resolveEvent(event)
+
+def resolveEvent(event: Event, handler: Callable[[Event], int] | None = None) -> int:
+    """
+    Run the hooks for the event's type, then its handler. The handler is looked up in RESOLUTION_REGISTRY unless it is
+    given, or a hook replaced the event with one of another type.
+    """
+    type = event.type
+    hooks = HOOK_REGISTRY[type]
+    if hooks.observed:
+        event = hooks.resolve(event)
+        if isinstance(event, int): return event
+    if handler is None or event.type != type:
+        handler = RESOLUTION_REGISTRY[event.type]
+    return handler(event)
 
 
 def ServerCommandHandler(event: ServerCommandEvent):
     if event.command == "exit":
         eventQueue.put_nowait(ServerShutdownEvent())
     if event.command == "lookup":
-        getLogger().info(f"User with uuid {event.args[0]} has username {auth.get_username_from_uuid(CLI_CONNECTION, event.args[0])}", True)
+        getLogger().info(f"User with uuid {event.args[0]} has username {auth.get_username_from_uuid(leasedConnection(), event.args[0])}", True)
+    if event.command == "stats":
+        getLogger().info(f"Connection pool: {CONNECTION_POOL.stats()}", True)
+        getLogger().info(f"Password hashing: {HASHING_QUEUE.metrics()}", True)
+        getLogger().info(f"User directory: {auth.directory_stats()}", True)
+        getLogger().info(f"Permissions: {permissions.permission_stats()}", True)
+        getLogger().info(f"Project subscriptions: {PROJECT_SUBSCRIPTIONS.stats()}", True)
+        getLogger().info(f"Hooks: { {type.name: hooks.stats() for type, hooks in HOOK_REGISTRY.items() if hooks.timed} }", True)
     return 0
 
 def ShutdownEventHandler(event: ServerShutdownEvent):
     getLogger().info("Shutting down server...", True)
     wsControlQueue.put_nowait("exit")
     wsControlQueue.shutdown()
-    CLI_CONNECTION.close()
+    # Resolved on the loop, so the last flush waits for a pooled connection on a thread of its own.
+    # asyncio.run waits for it before the process exits
+    asyncio.get_running_loop().run_in_executor(None, close_backends)
     return 0
 
+def close_backends() -> None:
+    if ITEM_BUFFER is not None:
+        with lease():
+            ITEM_BUFFER.flush(leasedConnection())
+            # The journal is only cut down once the flush commits at the end of the lease
+            afterTransaction(leasedConnection(), lambda committed: ITEM_BUFFER.close())
+    CONNECTION_POOL.close()
+    HASHING_QUEUE.shutdown()
+
 def ClientConnectedHandler(event: ClientConnectedEvent):
     getLogger().info("Client connected", True)
     return 0
@@ -37,20 +69,26 @@ def ClientDisconnectedHandler(event: ClientDisconnectedEvent):
 
 def ClientMessageHandler(event: ClientMessageEvent):
     getLogger().info(event.payload, True) # TODO: Remove
-    allFieldsPresent, errorMsg = auth_sgu_message(event.payload)
-    if not allFieldsPresent:
-        eventQueue.put_nowait(SendMessageEvent(event.listener, event.transport, {'type': "error", 'message': errorMsg}))
+    route, errorMsg = auth_sgu_message(event.payload)
+    if route is None:
+        event.listener.send({'type': "error", 'message': errorMsg})
         return 1
-    if event.listener not in AUTH_LISTENERS.values():
-        if event.payload['type'] == "auth-login":
-            event.listener.on_initial_connection(event.transport, event.payload)
+    if AUTH_LISTENERS.get(event.listener.uuid) is not event.listener:
+        if route.type == SGUMsgType.AUTH_LOGIN:
+            event.listener.on_initial_connection(event.connection, event.transport, event.payload)
         else:
-            eventQueue.put_nowait(SendMessageEvent(event.listener, event.transport, {'type': "error", 'message': "You must authenticate before performing any other operations!"}))
+            event.listener.send({'type': "error", 'message': "You must authenticate before performing any other operations!"})
             return 1
-    else:
-        newEvent = find_event_type(event.payload['type'])
-        if newEvent != None:
-            eventQueue.put_nowait(SGUEvent(newEvent, event.listener, event.transport, event.payload))
+    elif route.event_type is not None:
+        # Already running in order for this client, so the message is handled here rather than queued again
+        return resolveEvent(SGUEvent(route.event_type, event.listener, event.transport, event.payload), route.handler)
+    return 0
+
+def LoginResultHandler(event: LoginResultEvent):
+    try:
+        event.listener.on_login_result(event.connection, event.transport, event.payload, event.result, event.created)
+    finally:
+        event.listener.login_pending = False
     return 0
         
 
@@ -59,29 +97,54 @@ def SendMessageHandler(event: SendMessageEvent):
         getLogger().info(f"Sending message via connection with id {event.listener}", False)
     else:
         getLogger().info(f"Sending message to user with uuid {event.listener.uuid}", False)
-    send_json(event.transport, event.message)
+    event.listener.send(event.message)
     return 0
 
 
-def send_json(transport: WSTransport, json: dict[str, any]) -> None:
-    transport.send(WSMsgType.TEXT, bytes(dumps(json), 'utf-8'))
+def send_after_commit(connection, listener: ServerClientListener, message: dict[str, any]) -> None:
+    """
+    Send a reply once the unit of work open on the connection commits, so the client is only told about changes that
+    were actually made. Nothing is sent if it rolls back.
+    """
+    def send(committed: bool) -> None:
+        if committed:
+            listener.send(message)
+    afterTransaction(connection, send)
+
+def send_chunked(listener: ServerClientListener, message: dict[str, any], field: str, chunks, empty) -> None:
+    """
+    Send a large result as a sequence of messages instead of a single frame, for clients that asked for it to be streamed.
 
-def auth_sgu_message(payload: dict[str, any]) -> tuple[bool, str | None]:
+    Each message is a copy of message carrying one chunk of the result under field, along with its 'chunk' index.
+    'more' is True on every message except the last. If there are no chunks, a single message carrying empty is sent.
+    Each chunk is sent as soon as it is read, so the loop keeps serving other clients while the rest are fetched.
     """
-    Authenticate an SGU Message payload.
+    index = 0
+    previous = empty
+    for chunk in chunks:
+        if index != 0:
+            listener.send(message | {field: previous, 'chunk': index - 1, 'more': True})
+        previous = chunk
+        index += 1
+    listener.send(message | {field: previous, 'chunk': max(index - 1, 0), 'more': False})
+
+def auth_sgu_message(payload: dict[str, any]) -> tuple[MessageRoute | None, str | None]:
+    """
+    Authenticate an SGU Message payload, and find its route in the same lookup.
+    
+    Typed fields, such as ids and quantities, are coerced to their types in place, in the same pass.
     
     :param payload: The payload recieved, to authenticate
     :type payload: dict[str, any]
-    :return: A tuple, where the first element is True iff the payload has all necessary fields, and the second element is
-    a string describing the error iff the first element is False
-    :rtype: tuple[bool, str]
+    :return: A tuple, where the first element is the message's route iff the payload has all necessary fields with
+    valid values, and the second element is a string describing the error iff the first element is None
+    :rtype: tuple[MessageRoute | None, str | None]
     """
-    typeFieldPresent = auth.data_present(payload, ['type'])[0]
-    if not typeFieldPresent:
-        return False, "The type of the message must be specified!"
-    msgType = find_type(payload['type'])
-    if msgType is None:
-        return False, "Invalid type!"
+    if not isinstance(payload, dict) or 'type' not in payload:
+        return None, "The type of the message must be specified!"
+    route = MESSAGE_REGISTRY.get(payload['type']) if isinstance(payload['type'], str) else None
+    if route is None:
+        return None, "Invalid type!"
     
-    allFieldsPresent, missingFields = auth.data_present(payload, msgType.value[1])
-    return allFieldsPresent, None if allFieldsPresent else "Missing fields: " + ", ".join(missingFields)
\ No newline at end of file
+    errorMsg = route.schema.validate(payload)
+    return (route if errorMsg is None else None), errorMsg
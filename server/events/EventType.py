@@ -7,6 +7,7 @@ class EventType(Enum):
     CLIENT_DISCONNECTED     = auto()
     CLIENT_MESSAGE          = auto()
     SEND_MESSAGE            = auto()
+    LOGIN_RESULT            = auto()
     AUTH_GROUP              = auto()
     AUTH_PROJECT            = auto()
     GROUP_CREATE            = auto()
@@ -19,17 +20,23 @@ class EventType(Enum):
     GROUP_LIST              = auto()
     INVENTORY_ADD           = auto()
     INVENTORY_REMOVE        = auto()
+    INVENTORY_SYNC          = auto()
     ITEM_GET                = auto()
     ITEM_ADD                = auto()
     ITEM_REMOVE             = auto()
     ITEM_DELETE             = auto()
     ITEM_TRANSFER           = auto()
+    ITEM_BATCH              = auto()
+    ITEM_FLUSH              = auto()
     PROJECT_VIEW_ALL        = auto()
     PROJECT_VIEW_ONE        = auto()
     PROJECT_CREATE          = auto()
     PROJECT_DELETE          = auto()
     PROJECT_TRANSFER        = auto()
     PROJECT_SCOPE           = auto()
+    PROJECT_SUBSCRIBE       = auto()
+    PROJECT_UNSUBSCRIBE     = auto()
+    PROJECT_PROGRESS        = auto()
     PROJECT_ITEM_TRACK      = auto()
     PROJECT_ITEM_DELETE     = auto()
     PROJECT_ITEM_ADD        = auto()
@@ -1,14 +1,27 @@
+from backend.connect import leasedConnection
 from events.EventType import EventType
 from typing import TYPE_CHECKING
+from utils import Lane
 
 if TYPE_CHECKING:
+    from concurrent.futures import Future
     from picows import WSTransport, WSFrame
 
     from serverClientListener import ServerClientListener
 
+# Control events jump ahead of replies, and replies jump ahead of client requests. Anything not listed is a request.
+LANES = {
+    EventType.SERVER_SHUTDOWN: Lane.CONTROL,
+    EventType.SERVER_COMMAND: Lane.CONTROL,
+    EventType.CLIENT_CONNECTED: Lane.CONTROL,
+    EventType.CLIENT_DISCONNECTED: Lane.CONTROL,
+    EventType.SEND_MESSAGE: Lane.OUTBOUND
+}
+
 class Event():
     def __init__(self, type: EventType) -> None:
         self.type: EventType = type
+        self.lane: Lane = LANES.get(type, Lane.WORK)
 
 
 class ServerCommandEvent(Event):
@@ -30,12 +43,27 @@ class ServerShutdownEvent(Event):
         super().__init__(EventType.SERVER_SHUTDOWN)
 
 
+class ItemFlushEvent(Event):
+    def __init__(self):
+        super().__init__(EventType.ITEM_FLUSH)
+
+
+class ProjectProgressEvent(Event):
+    def __init__(self):
+        super().__init__(EventType.PROJECT_PROGRESS)
+
+
 class ClientEvent(Event):
     def __init__(self, type: EventType, listener: ServerClientListener, transport: WSTransport):
         self.listener = listener
         self.transport = transport
         super().__init__(type)
 
+    @property
+    def connection(self):
+        """The pooled connection leased for the handler currently resolving this event."""
+        return leasedConnection()
+
 
 class ClientConnectedEvent(ClientEvent):
     def __init__(self, listener: ServerClientListener):
@@ -60,14 +88,18 @@ class SendMessageEvent(ClientEvent):
         super().__init__(EventType.SEND_MESSAGE, listener, transport)
 
 
+class LoginResultEvent(ClientEvent):
+    def __init__(self, listener: ServerClientListener, transport: WSTransport, payload: dict[str, any], result: Future, created: bool):
+        self.payload = payload
+        self.result = result
+        self.created = created
+        super().__init__(EventType.LOGIN_RESULT, listener, transport)
+
+
 class SGUEvent(ClientEvent):
     def __init__(self, type: EventType, listener: ServerClientListener, transport: WSTransport, payload: dict[str, any]):
         self.payload = payload
         super().__init__(type, listener, transport)
-    
-    @property
-    def connection(self):
-        return self.listener.connection
 
 
 class AuthActionEvent(ClientEvent):
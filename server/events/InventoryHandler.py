@@ -2,6 +2,7 @@ from globals import getLogger
 
 from backend import items
 from events.Events import SGUEvent
+from events.ProjectHandler import touch_progress
 
 def AddHandler(event: SGUEvent) -> int:
     getLogger().info(f"User with uuid {event.listener.uuid} is adding inventory {event.payload['external_id']}", False)
@@ -10,5 +11,6 @@ def AddHandler(event: SGUEvent) -> int:
 
 def RemoveHandler(event: SGUEvent) -> int:
     getLogger().info(f"User with uuid {event.listener.uuid} is removing inventory {event.payload['external_id']}", False)
-    items.remove_inventory(event.connection, event.payload['external_id'])
+    for item_id, project_id in items.remove_inventory(event.connection, event.payload['external_id']):
+        touch_progress(event.connection, project_id, item_id)
     return 0
\ No newline at end of file
@@ -1,32 +1,41 @@
-from globals import getLogger, eventQueue
+from globals import getLogger
 
 from backend import items
-from events import SGUEvent, SendMessageEvent
+from backend.connect import leasedConnection
+from events import AuthActionEvent, EventType, ItemFlushEvent, SGUEvent
+from events.EventHandler import handleEvent, send_after_commit, send_chunked
+from events.ProjectHandler import touch_progress
 
 
 def GetHandler(event: SGUEvent) -> int:
     getLogger().info(f"User with uuid {event.listener.uuid} getting item from inventory {event.payload['external_id']}", False)
+    if event.payload.get('stream', False):
+        send_chunked(event.listener, {'type': "item-info", 'inventory': event.payload['external_id']}, 'items',
+                    items.stream_items(event.connection, items.get_internal_id(event.connection, event.payload['external_id'])), [])
+        return 0
     item_list = items.get_items(event.connection, items.get_internal_id(event.connection, event.payload['external_id']))
-    eventQueue.put_nowait(SendMessageEvent(event.listener, event.transport, {'type': "item-info", 'items': item_list, 'inventory': event.payload['external_id']}))
+    event.listener.send({'type': "item-info", 'items': item_list, 'inventory': event.payload['external_id']})
     return 0
 
 def AddHandler(event: SGUEvent) -> int:
     getLogger().info(f"User with uuid {event.listener.uuid} adding {event.payload['item_qty']}x {event.payload['item_id']} to inventory {event.payload['external_id']}", False)
     qty = items.add_item(event.connection, items.get_internal_id(event.connection, event.payload['external_id']), 
                         event.payload['item_id'], event.payload['item_qty'])
-    eventQueue.put_nowait(SendMessageEvent(event.listener, event.transport, {'type': "item-info", 'items': [(event.payload['item_id'], qty)], 'inventory': event.payload['external_id']}))
+    send_after_commit(event.connection, event.listener, {'type': "item-info", 'items': [(event.payload['item_id'], qty)], 'inventory': event.payload['external_id']})
     return 0
 
 def RemoveHandler(event: SGUEvent) -> int:
     getLogger().info(f"User with uuid {event.listener.uuid} removing {event.payload['item_qty']}x {event.payload['item_id']} from inventory {event.payload['external_id']}", False)
-    qty = items.remove_item(event.connection, items.get_internal_id(event.payload['external_id']),
+    qty = items.remove_item(event.connection, items.get_internal_id(event.connection, event.payload['external_id']),
                         event.payload['item_id'], event.payload['item_qty'])
-    eventQueue.put_nowait(SendMessageEvent(event.listener, event.transport, {'type': "item-info", 'items': [(event.payload['item_id'], qty)], 'inventory': event.payload['external_id']}))
+    send_after_commit(event.connection, event.listener, {'type': "item-info", 'items': [(event.payload['item_id'], qty)], 'inventory': event.payload['external_id']})
     return 0
 
 def DeleteHandler(event: SGUEvent) -> int:
     getLogger().info(f"User with uuid {event.listener.uuid} deleting {event.payload['item_id']} from inventory {event.payload['external_id']}", False)
-    items.delete_item(event.connection, items.get_internal_id(event.connection, event.payload['external_id']), event.payload['item_id'])
+    reserved = items.delete_item(event.connection, items.get_internal_id(event.connection, event.payload['external_id']), event.payload['item_id'])
+    for project_id in reserved:
+        touch_progress(event.connection, project_id, event.payload['item_id'])
     return 0
 
 def TransferHandler(event: SGUEvent) -> int:
@@ -34,6 +43,69 @@ def TransferHandler(event: SGUEvent) -> int:
     qtys = items.transfer_item(event.connection, event.payload['item_id'], 
                         items.get_internal_id(event.connection, event.payload['source_id']), 
                         items.get_internal_id(event.connection, event.payload['target_id']), event.payload['item_qty'])
-    eventQueue.put_nowait(SendMessageEvent(event.listener, event.transport, {'type': "item-info", 'items': [(event.payload['item_id'], qtys[0])], 'inventory': event.payload['source_id']}))
-    eventQueue.put_nowait(SendMessageEvent(event.listener, event.transport, {'type': "item-info", 'items': [(event.payload['item_id'], qtys[1])], 'inventory': event.payload['target_id']}))
+    send_after_commit(event.connection, event.listener, {'type': "item-info", 'items': [(event.payload['item_id'], qtys[0])], 'inventory': event.payload['source_id']})
+    send_after_commit(event.connection, event.listener, {'type': "item-info", 'items': [(event.payload['item_id'], qtys[1])], 'inventory': event.payload['target_id']})
+    return 0
+
+def parse_item_changes(entries: list) -> list[tuple[str, int, int | None]] | None:
+    """
+    Validate a list of [item_id, delta, project_id] entries, where the project id is optional and -1 means no project.
+
+    Returns the entries as (item_id, delta, project_id) tuples, or None if any entry is malformed.
+    """
+    if not isinstance(entries, list):
+        return None
+    changes = []
+    try:
+        for entry in entries:
+            project_id = entry[2] if len(entry) > 2 else None
+            project_id = None if project_id is None or int(project_id) == -1 else int(project_id)
+            changes.append((str(entry[0]), int(entry[1]), project_id))
+    except (TypeError, ValueError, IndexError, KeyError):
+        return None
+    return changes
+
+def BatchHandler(event: SGUEvent) -> int:
+    getLogger().info(f"User with uuid {event.listener.uuid} applying a batch of item changes to inventory {event.payload['external_id']}", False)
+    changes = parse_item_changes(event.payload['items'])
+    if changes is None:
+        event.listener.send({'type': "error", 'message': "Item batches must be a list of [item_id, delta, project_id] entries!"})
+        getLogger().warn(f"User with uuid {event.listener.uuid} sent a malformed item batch", False)
+        return 1
+    for project_id in {change[2] for change in changes if change[2] is not None}:
+        if handleEvent(AuthActionEvent(EventType.AUTH_PROJECT, event.listener, event.transport, "member", project_id)) != 0:
+            return 1
+
+    inventory = items.get_internal_id(event.connection, event.payload['external_id'])
+    # Buffered changes were made first, so they are written before the batch is applied on top of them
+    items.settle(event.connection)
+    rows = items.apply_item_changes(event.connection, [(inventory, *change) for change in changes])
+    for row in rows:
+        touch_progress(event.connection, row[3], row[1])
+    send_after_commit(event.connection, event.listener, {'type': "item-info", 'items': [(row[1], row[2], row[3]) for row in rows], 
+                            'inventory': event.payload['external_id']})
+    return 0
+
+def SyncHandler(event: SGUEvent) -> int:
+    getLogger().info(f"User with uuid {event.listener.uuid} syncing the contents of inventory {event.payload['external_id']}", False)
+    snapshot = parse_item_changes(event.payload['items'])
+    if snapshot is None:
+        event.listener.send({'type': "error", 'message': "Inventory snapshots must be a list of [item_id, count, project_id] entries!"})
+        getLogger().warn(f"User with uuid {event.listener.uuid} sent a malformed inventory snapshot", False)
+        return 1
+    for project_id in {entry[2] for entry in snapshot if entry[2] is not None}:
+        if handleEvent(AuthActionEvent(EventType.AUTH_PROJECT, event.listener, event.transport, "member", project_id)) != 0:
+            return 1
+
+    diff = items.sync_items(event.connection, items.get_internal_id(event.connection, event.payload['external_id']), snapshot)
+    for item_id, count, project_id in diff:
+        touch_progress(event.connection, project_id, item_id)
+    send_after_commit(event.connection, event.listener, {'type': "item-info", 'items': diff, 'inventory': event.payload['external_id']})
+    return 0
+
+def FlushHandler(event: ItemFlushEvent) -> int:
+    if items.WRITE_BEHIND is None or not items.WRITE_BEHIND.due():
+        return 0
+    written = items.WRITE_BEHIND.flush(leasedConnection())
+    getLogger().debug(f"Flushed {written} buffered item changes", False)
     return 0
\ No newline at end of file
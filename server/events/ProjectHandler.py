@@ -1,32 +1,62 @@
-from globals import getLogger, eventQueue
+from globals import AUTH_LISTENERS, PROJECT_SUBSCRIPTIONS, getLogger
 
-from backend import auth, items, projects
-from events.EventHandler import handleEvent
-from events.Events import SGUEvent, SendMessageEvent, AuthActionEvent
+from backend import auth, permissions, projects
+from backend.connect import afterTransaction, leasedConnection
+from events.EventHandler import handleEvent, send_chunked
+from events.Events import SGUEvent, AuthActionEvent, ProjectProgressEvent
 from events.EventType import EventType
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from serverClientListener import ServerClientListener
+
+PROJECT_PAGE_SIZE = 100
+MAX_PROJECT_PAGE_SIZE = 1000
+
+def touch_progress(connection, project_id, *item_ids: str) -> None:
+    """
+    Mark the items of the project as changed once the unit of work open on the connection commits, so its subscribers
+    are sent their new progress on the next tick, and never a total from before the change.
+    """
+    if project_id is None or int(project_id) == -1:
+        return
+    def touch(committed: bool) -> None:
+        if committed:
+            PROJECT_SUBSCRIPTIONS.touch(int(project_id), *item_ids)
+    afterTransaction(connection, touch)
 
 def AuthProject(event: AuthActionEvent) -> int:
     match event.level:
         case "owner":
-            if event.id in projects.get_owned_projects(event.connection, event.listener.uuid): return 0
-            eventQueue.put_nowait(SendMessageEvent(event.listener, event.transport, {
+            if permissions.owns_project(event.connection, event.listener.uuid, event.id): return 0
+            event.listener.send({
                     'type': "error",
                     'message': "You can't perform that action on a project you don't own!"
-                }))
+                })
         case "member":
-            if event.id in [x[0] for x in projects.get_projects(event.connection, event.listener.uuid)]: return 0
-            eventQueue.put_nowait(SendMessageEvent(event.listener, event.transport, {
+            if permissions.can_access_project(event.connection, event.listener.uuid, event.id): return 0
+            event.listener.send({
                     'type': "error",
                     'message': "You can't perform that action on a project you don't have access to!"
-                }))
+                })
     getLogger().warn(f"User with uuid {event.listener.uuid} does not have {event.level} permissions to perform actions on project {event.id}", True)
     return 1
 
 
 def ViewAllHandler(event: SGUEvent) -> int:
     getLogger().info(f"User with uuid {event.listener.uuid} viewing all projects", False)
-    proj = projects.get_projects(event.connection, event.listener.uuid)
-    eventQueue.put_nowait(SendMessageEvent(event.listener, event.transport, {'type': "project-info-all", 'projects': proj}))
+    # after_id and limit are optional, and already coerced to ints by the message's schema when they are given
+    after_id = event.payload.get('after_id') or 0
+    limit = event.payload.get('limit')
+    if event.payload.get('stream', False):
+        send_chunked(event.listener, {'type': "project-info-all"}, 'projects',
+                    projects.stream_projects(event.connection, event.listener.uuid, after_id, None if limit is None else max(0, limit)), [])
+        return 0
+    limit = max(1, min(PROJECT_PAGE_SIZE if limit is None else limit, MAX_PROJECT_PAGE_SIZE))
+    proj = projects.get_projects(event.connection, event.listener.uuid, after_id, limit)
+    # A full page means there may be more; the client asks for them by sending next_after_id back as after_id
+    event.listener.send({'type': "project-info-all", 'projects': proj,
+                            'next_after_id': proj[-1][0] if len(proj) == limit else None})
     return 0
 
 def ViewOneHandler(event: SGUEvent) -> int:
@@ -34,30 +64,16 @@ def ViewOneHandler(event: SGUEvent) -> int:
     if handleEvent(AuthActionEvent(EventType.AUTH_PROJECT, event.listener, event.transport, "member", event.payload['project_id'])) != 0:
         return 1
     
-    goal = projects.get_project_goal(event.connection, event.payload['project_id'])
-    gathered = projects.get_items_for_project(event.connection, event.payload['project_id'])
-    total = {}
-    for entry in gathered:
-        if entry['id'] in total:
-            total[entry['id']] += entry['count']
-        else:
-            total[entry['id']] = entry['count']
-        entry['inventory'] = items.get_remote_id(event.connection, entry['inventory'])
-    progress = {}
-    for item in goal:
-        if item not in total:
-            total[item] = 0
-        progress[item] = {'goal': goal[item], 'gathered': total[item]}
-    
-    eventQueue.put_nowait(SendMessageEvent(event.listener, event.transport, {'type': "project-info-single", 'project_id': event.payload['project_id'],
-                            'goal': goal, 'gathered': gathered, 'progress': progress}))
+    goal, gathered, progress = projects.get_project_details(event.connection, event.payload['project_id'])
+    event.listener.send({'type': "project-info-single", 'project_id': event.payload['project_id'],
+                            'goal': goal, 'gathered': gathered, 'progress': progress})
     getLogger().info("Info sent", False)
     return 0
 
 def CreateHandler(event: SGUEvent) -> int:
     getLogger().info(f"User with uuid {event.listener.uuid} is creating project {event.payload['name']}", False)
     if (event.payload['scope'] == "GROUP" and int(event.payload['group_id']) == -1):
-        eventQueue.put_nowait(SendMessageEvent(event.listener, event.transport, {'type': "error", 'message': "You must specify the group ID if setting scope to group!"}))
+        event.listener.send({'type': "error", 'message': "You must specify the group ID if setting scope to group!"})
         getLogger().warn("Project with scope GROUP does not have group id specified", False)
         return 1
     if int(event.payload['group_id'] == -1):
@@ -72,6 +88,7 @@ def DeleteHandler(event: SGUEvent) -> int:
     if handleEvent(AuthActionEvent(EventType.AUTH_PROJECT, event.listener, event.transport, "owner", event.payload['project_id'])) != 0: 
         return 1
     projects.delete_project(event.connection, event.payload['project_id'])
+    PROJECT_SUBSCRIPTIONS.drop(int(event.payload['project_id']))
     getLogger().info("Deletion success", False)
     return 0
 
@@ -80,14 +97,14 @@ def TransferHandler(event: SGUEvent) -> int:
     if handleEvent(AuthActionEvent(EventType.AUTH_PROJECT, event.listener, event.transport, "owner", event.payload['project_id'])) != 0: 
         return 1
     if not auth.username_exists(event.connection, event.payload['new_owner_username']):
-        eventQueue.put_nowait(SendMessageEvent(event.listener, event.transport, {'type': "error", 'message': "You can't transfer the project to a player who doesn't exist!"}))
+        event.listener.send({'type': "error", 'message': "You can't transfer the project to a player who doesn't exist!"})
         getLogger().warn(f"User with uuid {event.listener.uuid} attempted to transfer a project to a player who doesn't exist", True)
         return 1
     
     new_uuid = auth.get_uuid_from_username(event.connection, event.payload['new_owner_username'])
 
     if new_uuid == event.listener.uuid:
-        eventQueue.put_nowait(SendMessageEvent(event.listener, event.transport, {'type': "error", 'message': "You can't transfer ownership of a group to yourself!"}))
+        event.listener.send({'type': "error", 'message': "You can't transfer ownership of a group to yourself!"})
         getLogger().warn(f"User with uuid {event.listener.uuid} attempted to transfer a group to themself", True)
         return 1
 
@@ -100,10 +117,54 @@ def ScopeHandler(event: SGUEvent) -> int:
     if handleEvent(AuthActionEvent(EventType.AUTH_PROJECT, event.listener, event.transport, "owner", event.payload['project_id'])) != 0: 
         return 1
     if (event.payload['scope'] == "GROUP" and int(event.payload['group_id']) == -1):
-        eventQueue.put_nowait(SendMessageEvent(event.listener, event.transport, {'type': "error", 'message': "You must specify the group ID if setting scope to group!"}))
+        event.listener.send({'type': "error", 'message': "You must specify the group ID if setting scope to group!"})
         getLogger().warn("Project with scope GROUP does not have group id specified", False)
         return 1
     projects.change_scope(event.connection, event.payload['project_id'], event.payload['scope'], 
                         event.payload['group_id'] if int(event.payload['group_id']) != -1 else None)
     getLogger().info("Scope Change success", False)
+    return 0
+
+def SubscribeHandler(event: SGUEvent) -> int:
+    getLogger().info(f"User with uuid {event.listener.uuid} subscribing to progress of project {event.payload['project_id']}", False)
+    if handleEvent(AuthActionEvent(EventType.AUTH_PROJECT, event.listener, event.transport, "member", event.payload['project_id'])) != 0:
+        return 1
+    PROJECT_SUBSCRIPTIONS.subscribe(int(event.payload['project_id']), event.listener)
+    # The full progress is sent once, and only the items that change are pushed after that
+    event.listener.send({'type': "project-progress", 
+                            'projects': {int(event.payload['project_id']): projects.get_progress(event.connection, event.payload['project_id'])}})
+    return 0
+
+def UnsubscribeHandler(event: SGUEvent) -> int:
+    getLogger().info(f"User with uuid {event.listener.uuid} unsubscribing from progress of project {event.payload['project_id']}", False)
+    PROJECT_SUBSCRIPTIONS.unsubscribe(int(event.payload['project_id']), event.listener)
+    return 0
+
+def ProgressHandler(event: ProjectProgressEvent) -> int:
+    connection = leasedConnection()
+    changes = {}
+    pushes: dict[ServerClientListener, list[int]] = {}
+    for project_id, (item_ids, subscribers) in PROJECT_SUBSCRIPTIONS.take().items():
+        for listener in subscribers:
+            if AUTH_LISTENERS.get(listener.uuid) is not listener or not permissions.can_access_project(connection, listener.uuid, project_id):
+                PROJECT_SUBSCRIPTIONS.unsubscribe(project_id, listener)
+                continue
+            if project_id not in changes:
+                changes[project_id] = projects.get_progress(connection, project_id, list(item_ids))
+            if len(changes[project_id]) != 0:
+                pushes.setdefault(listener, []).append(project_id)
+
+    # Subscribers watching the same changed projects with the same codec get the same message, so it is only encoded once for all of them.
+    # Stateful codecs belong to a single connection, so those messages are encoded as they are sent.
+    encoded: dict[tuple, bytes] = {}
+    for listener, project_ids in pushes.items():
+        message = {'type': "project-progress", 'projects': {project_id: changes[project_id] for project_id in project_ids}}
+        if listener.codec.stateful:
+            listener.send(message)
+            continue
+        key = (listener.codec, *project_ids)
+        if key not in encoded:
+            encoded[key] = listener.codec.encode(message)
+        listener.send(encoded[key])
+    getLogger().debug(f"Pushed project progress to {len(pushes)} subscribers in {len(encoded)} distinct messages", False)
     return 0
\ No newline at end of file
@@ -1,8 +1,9 @@
-from globals import eventQueue, getLogger
+from globals import getLogger
 
 from backend import items, projects
-from events.EventHandler import handleEvent
-from events.Events import AuthActionEvent, SGUEvent, SendMessageEvent
+from events.EventHandler import handleEvent, send_after_commit
+from events.ProjectHandler import touch_progress
+from events.Events import AuthActionEvent, SGUEvent
 from events.EventType import EventType
 
 def TrackHandler(event: SGUEvent) -> int:
@@ -10,6 +11,7 @@ def TrackHandler(event: SGUEvent) -> int:
     if handleEvent(AuthActionEvent(EventType.AUTH_PROJECT, event.listener, event.transport, "member", event.payload['project_id'])) != 0:
         return 1
     projects.add_item(event.connection, event.payload['project_id'], event.payload['item_id'], event.payload['item_qty'])
+    touch_progress(event.connection, event.payload['project_id'], event.payload['item_id'])
     getLogger().info("Tracking successful", False)
     return 0
 
@@ -18,6 +20,7 @@ def DeleteHandler(event: SGUEvent) -> int:
     if handleEvent(AuthActionEvent(EventType.AUTH_PROJECT, event.listener, event.transport, "member", event.payload['project_id'])) != 0:
         return 1
     projects.remove_item(event.connection, event.payload['project_id'], event.payload['item_id'])
+    touch_progress(event.connection, event.payload['project_id'], event.payload['item_id'])
     getLogger().info("Deletion successful", False)
     return 0
 
@@ -27,8 +30,9 @@ def AddHandler(event: SGUEvent) -> int:
         return 1
     qty = items.add_item(event.connection, items.get_internal_id(event.connection, event.payload['external_id']), event.payload['item_id'],
                     event.payload['item_qty'], event.payload['project_id'])
-    eventQueue.put_nowait(SendMessageEvent(event.listener, event.transport, {'type': "project-item-info", 'items': [(event.payload['item_id'], qty)], 'inventory': event.payload['external_id'], 
-                            'project_id': event.payload['project_id']}))
+    touch_progress(event.connection, event.payload['project_id'], event.payload['item_id'])
+    send_after_commit(event.connection, event.listener, {'type': "project-item-info", 'items': [(event.payload['item_id'], qty)], 'inventory': event.payload['external_id'], 
+                            'project_id': event.payload['project_id']})
     getLogger().info("Addition successful", False)
     return 0
 
@@ -38,8 +42,9 @@ def RemoveHandler(event: SGUEvent) -> int:
         return 1
     qty = items.remove_item(event.connection, items.get_internal_id(event.connection, event.payload['external_id']), event.payload['item_id'],
                     event.payload['item_qty'], event.payload['project_id'])
-    eventQueue.put_nowait(SendMessageEvent(event.listener, event.transport, {'type': "project-item-info", 'items': [(event.payload['item_id'], qty)], 'inventory': event.payload['external_id'], 
-                            'project_id': event.payload['project_id']}))
+    touch_progress(event.connection, event.payload['project_id'], event.payload['item_id'])
+    send_after_commit(event.connection, event.listener, {'type': "project-item-info", 'items': [(event.payload['item_id'], qty)], 'inventory': event.payload['external_id'], 
+                            'project_id': event.payload['project_id']})
     getLogger().info("Removal successful", False)
     return 0
 
@@ -50,11 +55,13 @@ def ReserveHandler(event: SGUEvent) -> int:
     qty1, qty2 = items.reserve_items(event.connection, event.payload['item_id'], items.get_internal_id(event.connection, event.payload['external_id']),
                         event.payload['target_project_id'], event.payload['item_qty'], 
                         event.payload['source_project_id'] if int(event.payload['source_project_id']) == -1 else None)
-    
-    eventQueue.put_nowait(SendMessageEvent(event.listener, event.transport, {'type': "project-item-info", 'items': [(event.payload['item_id'], qty1)], 'inventory': event.payload['external_id'],
-                            'project_id': event.payload['source_project_id']}))
-    eventQueue.put_nowait(SendMessageEvent(event.listener, event.transport, {'type': "project-item-info", 'items': [(event.payload['item_id'], qty2)], 'inventory': event.payload['external_id'],
-                            'project_id': event.payload['target_project_id']}))
+    touch_progress(event.connection, event.payload['source_project_id'], event.payload['item_id'])
+    touch_progress(event.connection, event.payload['target_project_id'], event.payload['item_id'])
+
+    send_after_commit(event.connection, event.listener, {'type': "project-item-info", 'items': [(event.payload['item_id'], qty1)], 'inventory': event.payload['external_id'],
+                            'project_id': event.payload['source_project_id']})
+    send_after_commit(event.connection, event.listener, {'type': "project-item-info", 'items': [(event.payload['item_id'], qty2)], 'inventory': event.payload['external_id'],
+                            'project_id': event.payload['target_project_id']})
     getLogger().info("Reservation successful", False)
     return 0
 
@@ -64,9 +71,10 @@ def ReleaseHandler(event: SGUEvent) -> int:
         return 1
     qty1, qty2 = items.unreserve_items(event.connection, event.payload['item_id'], items.get_internal_id(event.connection, event.payload['external_id']),
                                         event.payload['project_id'], event.payload['item_qty'])
-    eventQueue.put_nowait(SendMessageEvent(event.listener, event.transport, {'type': "project-item-info", 'items': [(event.payload['item_id'], qty1)], 'inventory': event.payload['external_id'],
-                            'project_id': event.payload['project_id']}))
-    eventQueue.put_nowait(SendMessageEvent(event.listener, event.transport, {'type': "project-item-info", 'items': [(event.payload['item_id'], qty1)], 'inventory': event.payload['external_id'],
-                            'project_id': -1}))
+    touch_progress(event.connection, event.payload['project_id'], event.payload['item_id'])
+    send_after_commit(event.connection, event.listener, {'type': "project-item-info", 'items': [(event.payload['item_id'], qty1)], 'inventory': event.payload['external_id'],
+                            'project_id': event.payload['project_id']})
+    send_after_commit(event.connection, event.listener, {'type': "project-item-info", 'items': [(event.payload['item_id'], qty1)], 'inventory': event.payload['external_id'],
+                            'project_id': -1})
     getLogger().info("Release successful", False)
     return 0
\ No newline at end of file
@@ -1,5 +1,27 @@
 from enum import Enum
+from typing import TYPE_CHECKING, Callable, NamedTuple
+
 from events.EventType import EventType
+from utils import Schema
+
+if TYPE_CHECKING:
+    from events.Events import Event
+
+# Fields coerced to a type when a message is validated. Fields not listed are passed through as they were decoded.
+FIELD_TYPES = {
+    'group_id': int,
+    'project_id': int,
+    'target_project_id': int,
+    'source_project_id': int,
+    'item_qty': int,
+    'after_id': int,
+    'limit': int
+}
+
+# Fields a message may leave out, by type string. They are coerced like the required fields when they are given.
+OPTIONAL_FIELDS = {
+    "project-view-all": ['after_id', 'limit']
+}
 
 class SGUMsgType(Enum):
     AUTH_SUCCESS = "auth-success", ['type'], None
@@ -16,17 +38,21 @@ class SGUMsgType(Enum):
     GROUP_LIST = "group-list", ['type'], EventType.GROUP_LIST
     INVENTORY_ADD = "inventory-add", ['type', 'external_id'], EventType.INVENTORY_ADD
     INVENTORY_REMOVE = "inventory-remove", ['type', 'external_id'], EventType.INVENTORY_REMOVE
+    INVENTORY_SYNC = "inventory-sync", ['type', 'external_id', 'items'], EventType.INVENTORY_SYNC
     ITEM_GET = "item-get", ['type', 'external_id'], EventType.ITEM_GET
     ITEM_ADD = "item-add", ['type', 'external_id', 'item_id', 'item_qty'], EventType.ITEM_ADD
     ITEM_REMOVE = "item-remove", ['type', 'external_id', 'item_id', 'item_qty'], EventType.ITEM_REMOVE
     ITEM_DELETE = "item-delete", ['type', 'external_id', 'item_id'], EventType.ITEM_DELETE
     ITEM_TRANSFER = "item-transfer", ['type', 'item_id', 'item_qty', 'source_id', 'target_id'], EventType.ITEM_TRANSFER
+    ITEM_BATCH = "item-batch", ['type', 'external_id', 'items'], EventType.ITEM_BATCH
     PROJECT_VIEW_ALL = "project-view-all", ['type'], EventType.PROJECT_VIEW_ALL
     PROJECT_VIEW_ONE = "project-view-one", ['type', 'project_id'], EventType.PROJECT_VIEW_ONE
     PROJECT_CREATE = "project-create", ['type', 'name', 'scope', 'desc', 'group_id'], EventType.PROJECT_CREATE
     PROJECT_DELETE = "project-delete", ['type', 'project_id'], EventType.PROJECT_DELETE
     PROJECT_TRANSFER = "project-transfer", ['type', 'project_id', 'new_owner_username'], EventType.PROJECT_TRANSFER
     PROJECT_SCOPE = "project-scope", ['type', 'project_id', 'scope', 'group_id'], EventType.PROJECT_SCOPE
+    PROJECT_SUBSCRIBE = "project-subscribe", ['type', 'project_id'], EventType.PROJECT_SUBSCRIBE
+    PROJECT_UNSUBSCRIBE = "project-unsubscribe", ['type', 'project_id'], EventType.PROJECT_UNSUBSCRIBE
     PROJECT_ITEM_TRACK = "project-item-track", ['type', 'project_id', 'item_id', 'item_qty'], EventType.PROJECT_ITEM_TRACK
     PROJECT_ITEM_DELETE = "project-item-delete", ['type', 'project_id', 'item_id'], EventType.PROJECT_ITEM_DELETE
     PROJECT_ITEM_ADD = "project-item-add", ['type', 'project_id', 'item_id', 'item_qty', 'external_id'], EventType.PROJECT_ITEM_ADD
@@ -37,18 +63,26 @@ class SGUMsgType(Enum):
 
 
 
+class MessageRoute(NamedTuple):
+    """Everything needed to take a message of one type from its payload to its handler."""
+    type: SGUMsgType
+    schema: Schema
+    event_type: EventType | None
+    handler: Callable[["Event"], int] | None
+
+
+TYPES: dict[str, SGUMsgType] = {enum.value[0]: enum for enum in SGUMsgType}
+
 def find_type(type: str) -> SGUMsgType | None:
     """
     Finds the SGU Message Type for the given type string
     
     :param type: The main type to search for
     :type type: str
-    :return: The first found SGUMsgType, or None if none is found
+    :return: The found SGUMsgType, or None if none is found
     :rtype: SGUMsgType | None
     """
-    for enum in SGUMsgType:
-        if enum.value[0] == type:
-            return enum
+    return TYPES.get(type)
     
 
 def find_event_type(type: str) -> EventType | None:
@@ -63,4 +97,14 @@ def find_event_type(type: str) -> EventType | None:
     t = find_type(type)
     if t == None:
         return t
-    return t.value[2]
\ No newline at end of file
+    return t.value[2]
+
+
+def compile_routes(handlers: dict[EventType, Callable[[Event], int]]) -> dict[str, MessageRoute]:
+    """
+    Compile every SGUMsgType into a route keyed by its type string, with its fields' schema and the handler
+    registered for its event type. Types without an event type, or whose handler is missing, get no handler.
+    """
+    return {enum.value[0]: MessageRoute(enum, Schema(enum.value[1], FIELD_TYPES, OPTIONAL_FIELDS.get(enum.value[0], [])), enum.value[2],
+                                       handlers.get(enum.value[2]))
+            for enum in SGUMsgType}
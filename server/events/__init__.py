@@ -1,3 +1,4 @@
+from events.dispatcher import Dispatcher
 from events.EventHandler import handleEvent
 from events.Events import *
 from events.EventType import EventType
@@ -0,0 +1,90 @@
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from traceback import format_exc
+
+from globals import getLogger
+from events.EventHandler import handleEvent
+from events.Events import ClientEvent, Event
+from events.EventType import EventType
+
+# Events that only touch the loop's own state (transports, control queues) are resolved on the loop itself
+INLINE_EVENTS = {
+    EventType.SERVER_SHUTDOWN,
+    EventType.CLIENT_CONNECTED,
+    EventType.CLIENT_DISCONNECTED,
+    EventType.SEND_MESSAGE
+}
+
+
+class Dispatcher():
+    """
+    Resolves queued events on a bounded pool of worker threads.
+
+    Events are grouped by the client that produced them; each client's events are resolved strictly in order, while
+    different clients are resolved in parallel. Server events share a single group of their own.
+
+    Once a client has max_in_flight events waiting, reading from it is paused until it falls back under the limit, so
+    a client flooding the server only delays itself.
+
+    While a client's login is waiting on the hashing pool, the rest of its events are held back. Its login result jumps
+    ahead of them, so everything it sent after logging in is resolved once it is logged in.
+    """
+    def __init__(self, workers: int, max_in_flight: int):
+        self.workers = workers
+        self.max_in_flight = max_in_flight
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="sgu-worker")
+        self._pending: dict[object, deque[Event]] = {}
+        self._holds: dict[object, asyncio.Future] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    def submit(self, event: Event) -> None:
+        if event.type in INLINE_EVENTS:
+            self._resolve(event)
+            return
+
+        key = event.listener if isinstance(event, ClientEvent) else None
+        pending = self._pending.get(key)
+        if pending is not None and event.type == EventType.LOGIN_RESULT:
+            pending.appendleft(event)
+            hold = self._holds.pop(key, None)
+            if hold is not None and not hold.done():
+                hold.set_result(None)
+            return
+        if pending is not None:
+            pending.append(event)
+            if key is not None and len(pending) >= self.max_in_flight:
+                key.pause_reading("in-flight")
+            return
+
+        self._pending[key] = deque([event])
+        task = asyncio.create_task(self._drain(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _drain(self, key) -> None:
+        loop = asyncio.get_running_loop()
+        pending = self._pending[key]
+        try:
+            while pending:
+                await loop.run_in_executor(self._executor, self._resolve, pending.popleft())
+                if key is not None and key.login_pending and (len(pending) == 0 or pending[0].type != EventType.LOGIN_RESULT):
+                    hold = self._holds[key] = loop.create_future()
+                    await hold
+                if key is not None and len(pending) < self.max_in_flight:
+                    key.resume_reading("in-flight")
+        finally:
+            del self._pending[key]
+            self._holds.pop(key, None)
+
+    def _resolve(self, event: Event) -> int:
+        try:
+            return handleEvent(event)
+        except Exception:
+            getLogger().error(f"Unhandled error while resolving {event.type}:\n{format_exc()}", True)
+            return 1
+
+    def shutdown(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
\ No newline at end of file
@@ -1,6 +1,7 @@
 from globals import *
 from events import EventHandler, GroupHandler, InventoryHandler, ItemHandler, ProjectHandler, ProjectItemHandler
 from events.EventType import EventType
+from events.SGUMsgType import compile_routes
 
 def registerHandlers():
     RESOLUTION_REGISTRY[EventType.SERVER_COMMAND] = EventHandler.ServerCommandHandler
@@ -9,6 +10,7 @@ def registerHandlers():
     RESOLUTION_REGISTRY[EventType.CLIENT_DISCONNECTED] = EventHandler.ClientDisconnectedHandler
     RESOLUTION_REGISTRY[EventType.CLIENT_MESSAGE] = EventHandler.ClientMessageHandler
     RESOLUTION_REGISTRY[EventType.SEND_MESSAGE] = EventHandler.SendMessageHandler
+    RESOLUTION_REGISTRY[EventType.LOGIN_RESULT] = EventHandler.LoginResultHandler
     RESOLUTION_REGISTRY[EventType.AUTH_GROUP] = GroupHandler.AuthUser
     RESOLUTION_REGISTRY[EventType.GROUP_CREATE] = GroupHandler.CreationHandler
     RESOLUTION_REGISTRY[EventType.GROUP_DELETE] = GroupHandler.DeletionHandler
@@ -20,11 +22,14 @@ def registerHandlers():
     RESOLUTION_REGISTRY[EventType.GROUP_LIST] = GroupHandler.ListHandler
     RESOLUTION_REGISTRY[EventType.INVENTORY_ADD] = InventoryHandler.AddHandler
     RESOLUTION_REGISTRY[EventType.INVENTORY_REMOVE] = InventoryHandler.RemoveHandler
+    RESOLUTION_REGISTRY[EventType.INVENTORY_SYNC] = ItemHandler.SyncHandler
     RESOLUTION_REGISTRY[EventType.ITEM_GET] = ItemHandler.GetHandler
     RESOLUTION_REGISTRY[EventType.ITEM_ADD] = ItemHandler.AddHandler
     RESOLUTION_REGISTRY[EventType.ITEM_REMOVE] = ItemHandler.RemoveHandler
     RESOLUTION_REGISTRY[EventType.ITEM_DELETE] = ItemHandler.DeleteHandler
     RESOLUTION_REGISTRY[EventType.ITEM_TRANSFER] = ItemHandler.TransferHandler
+    RESOLUTION_REGISTRY[EventType.ITEM_BATCH] = ItemHandler.BatchHandler
+    RESOLUTION_REGISTRY[EventType.ITEM_FLUSH] = ItemHandler.FlushHandler
     RESOLUTION_REGISTRY[EventType.AUTH_PROJECT] = ProjectHandler.AuthProject
     RESOLUTION_REGISTRY[EventType.PROJECT_VIEW_ALL] = ProjectHandler.ViewAllHandler
     RESOLUTION_REGISTRY[EventType.PROJECT_VIEW_ONE] = ProjectHandler.ViewOneHandler
@@ -32,9 +37,16 @@ def registerHandlers():
     RESOLUTION_REGISTRY[EventType.PROJECT_DELETE] = ProjectHandler.DeleteHandler
     RESOLUTION_REGISTRY[EventType.PROJECT_TRANSFER] = ProjectHandler.TransferHandler
     RESOLUTION_REGISTRY[EventType.PROJECT_SCOPE] = ProjectHandler.ScopeHandler
+    RESOLUTION_REGISTRY[EventType.PROJECT_SUBSCRIBE] = ProjectHandler.SubscribeHandler
+    RESOLUTION_REGISTRY[EventType.PROJECT_UNSUBSCRIBE] = ProjectHandler.UnsubscribeHandler
+    RESOLUTION_REGISTRY[EventType.PROJECT_PROGRESS] = ProjectHandler.ProgressHandler
     RESOLUTION_REGISTRY[EventType.PROJECT_ITEM_TRACK] = ProjectItemHandler.TrackHandler
     RESOLUTION_REGISTRY[EventType.PROJECT_ITEM_DELETE] = ProjectItemHandler.DeleteHandler
     RESOLUTION_REGISTRY[EventType.PROJECT_ITEM_ADD] = ProjectItemHandler.AddHandler
     RESOLUTION_REGISTRY[EventType.PROJECT_ITEM_REMOVE] = ProjectItemHandler.RemoveHandler
     RESOLUTION_REGISTRY[EventType.PROJECT_ITEM_RESERVE] = ProjectItemHandler.ReserveHandler
-    RESOLUTION_REGISTRY[EventType.PROJECT_ITEM_RELEASE] = ProjectItemHandler.ReleaseHandler
\ No newline at end of file
+    RESOLUTION_REGISTRY[EventType.PROJECT_ITEM_RELEASE] = ProjectItemHandler.ReleaseHandler
+
+    # Every SGUMsgType is routed to the handler registered above for its event type
+    MESSAGE_REGISTRY.clear()
+    MESSAGE_REGISTRY.update(compile_routes(RESOLUTION_REGISTRY))
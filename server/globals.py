@@ -1,23 +1,41 @@
 from asyncio import Queue
 from typing import TYPE_CHECKING
 
-from backend.connect import openConnection
-from utils import Logger
+from backend.connect import ConnectionPool, lease, leasedConnection, openPool
+from backend.hashing import HashingQueue, openHashingQueue
+from backend.items import WriteBehindBuffer, openWriteBehind
+from utils import EventQueue, Logger, SubscriptionRegistry
 
 if TYPE_CHECKING:
     from typing import Callable
 
     from events import EventType, Event
+    from events.SGUMsgType import MessageRoute
     from serverClientListener import ServerClientListener
     from utils import Observable
 
 HOOK_REGISTRY: dict[EventType, Observable] = {}
 RESOLUTION_REGISTRY: dict[EventType, Callable[[Event], int]] = {}
+MESSAGE_REGISTRY: dict[str, MessageRoute] = {}
 LOGGER: Logger = Logger()
 def getLogger():
     return LOGGER
 
-eventQueue: Queue[Event] = Queue()
+eventQueue: EventQueue = EventQueue()
 wsControlQueue: Queue[str] = Queue()
 AUTH_LISTENERS: dict[str, ServerClientListener] = {}
-CLI_CONNECTION = openConnection()
\ No newline at end of file
+PROJECT_SUBSCRIPTIONS: SubscriptionRegistry = SubscriptionRegistry()
+CONNECTION_POOL: ConnectionPool = openPool()
+HASHING_QUEUE: HashingQueue = openHashingQueue()
+ITEM_BUFFER: WriteBehindBuffer | None = openWriteBehind()
+
+def openBackends() -> None:
+    """
+    Open the connection pool, start the hashing pool and replay the item journal. The hashing pool's processes import
+    the server's modules again, so this is left to startup rather than done on import.
+    """
+    CONNECTION_POOL.open()
+    HASHING_QUEUE.start()
+    if ITEM_BUFFER is not None:
+        with lease():
+            ITEM_BUFFER.start(leasedConnection())
\ No newline at end of file
@@ -1,12 +1,14 @@
 import asyncio
-from picows import WSAutoPingStrategy, WSUpgradeRequest, ws_create_server
+from picows import WSAutoPingStrategy, WSUpgradeRequest, WSUpgradeResponse, WSUpgradeResponseWithListener, ws_create_server
 from prompt_toolkit import PromptSession
 from prompt_toolkit.patch_stdout import patch_stdout
 
+from config import load_options
 from globals import *
 from serverClientListener import ServerClientListener
-from events import EventType, ClientConnectedEvent, ServerCommandEvent, ServerShutdownEvent, registerHandlers, handleEvent
+from events import Dispatcher, EventType, ClientConnectedEvent, ItemFlushEvent, ProjectProgressEvent, ServerCommandEvent, ServerShutdownEvent, registerHandlers, handleEvent
 from utils import Observable
+from utils.wire import negotiate
 
 
 async def user_input():
@@ -23,7 +25,11 @@ async def user_input():
 
 async def server_loop():
     def listener_factory(r: WSUpgradeRequest):
-        return ServerClientListener()
+        codec, subprotocol = negotiate(r.headers.get("Sec-WebSocket-Protocol"))
+        if subprotocol is None:
+            return ServerClientListener()
+        response = WSUpgradeResponse.create_101_response(extra_headers={"Sec-WebSocket-Protocol": subprotocol})
+        return WSUpgradeResponseWithListener(response, ServerClientListener(codec))
         
     
     server: asyncio.Server = await ws_create_server(
@@ -45,22 +51,61 @@ async def server_loop():
     await server.wait_closed()
 
 async def event_handler():
+    # Every worker holds at most one pooled connection, so by default there are as many workers as connections
+    options = load_options(section='dispatcher', defaults={'workers': str(CONNECTION_POOL.maxconn), 'max_in_flight': "32"})
+    dispatcher = Dispatcher(int(options['workers']), int(options['max_in_flight']))
+    eventQueue.bind(asyncio.get_running_loop())
     while True:
         try:
             wsControlQueue.get_nowait()
         except asyncio.QueueEmpty:
-            handleEvent(await eventQueue.get())
+            dispatcher.submit(await eventQueue.get())
+        except asyncio.QueueShutDown:
+            dispatcher.shutdown()
+            return
+
+async def item_flusher():
+    while True:
+        try:
+            wsControlQueue.get_nowait()
+        except asyncio.QueueEmpty:
+            await asyncio.sleep(ITEM_BUFFER.flush_interval)
+            eventQueue.put_nowait(ItemFlushEvent())
+        except asyncio.QueueShutDown:
+            return
+
+async def progress_publisher():
+    # Every change to a subscribed project within a tick is coalesced into a single push per subscriber
+    tick = float(load_options(section='subscriptions', defaults={'tick': "0.25"})['tick'])
+    while True:
+        try:
+            wsControlQueue.get_nowait()
+        except asyncio.QueueEmpty:
+            await asyncio.sleep(tick)
+            if PROJECT_SUBSCRIPTIONS.pending():
+                eventQueue.put_nowait(ProjectProgressEvent())
         except asyncio.QueueShutDown:
             return
 
 async def main():
-    await asyncio.gather(user_input(), server_loop(), event_handler())
+    tasks = [user_input(), server_loop(), event_handler(), progress_publisher()]
+    if ITEM_BUFFER is not None:
+        tasks.append(item_flusher())
+    await asyncio.gather(*tasks)
 
 def startup():
+    LOGGER.info("Opening database connections and starting password hashing pool", False)
+    openBackends()
     LOGGER.info("Creating Hook Registries", False)
+    timed = load_options(section='hooks', defaults={'timing': "false"})['timing'].lower() == "true"
     for type in EventType:
         HOOK_REGISTRY[type] = Observable()
+        HOOK_REGISTRY[type].timed = timed
     registerHandlers()
+    if ITEM_BUFFER is not None:
+        LOGGER.info("Buffering item changes in a write-behind journal", False)
+        ITEM_BUFFER.on_full = lambda: eventQueue.put_nowait(ItemFlushEvent())
+        ITEM_BUFFER.on_dropped = lambda change, error: LOGGER.error(f"Dropped buffered item change {change}: {error}", True)
 
 def post_startup():
     for type in EventType:
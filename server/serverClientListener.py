@@ -1,25 +1,98 @@
-from globals import AUTH_LISTENERS, eventQueue, LOGGER
+from globals import AUTH_LISTENERS, PROJECT_SUBSCRIPTIONS, eventQueue, LOGGER
 
-from json import loads
-from picows import ws_create_server, WSFrame, WSTransport, WSListener, WSMsgType, WSUpgradeRequest, WSAutoPingStrategy
+from asyncio import AbstractEventLoop, get_running_loop
+from concurrent.futures import Future
+from threading import Lock, get_ident
+from picows import ws_create_server, WSCloseCode, WSFrame, WSTransport, WSListener, WSMsgType, WSUpgradeRequest, WSAutoPingStrategy
 
 from backend import auth
-from backend.connect import openConnection, writeData
-from events import ClientConnectedEvent, ClientDisconnectedEvent, ClientMessageEvent, SendMessageEvent
+from backend.hashing import QueueFull
+from config import load_options
+from events import ClientConnectedEvent, ClientDisconnectedEvent, ClientMessageEvent, LoginResultEvent
+from utils.wire import CODEC, Codec, frame
+
+# Reading from a client pauses once this many bytes of replies are waiting to be written to it, until it drains below the low mark
+WRITE_BUFFER_LIMITS = load_options(section='backpressure', defaults={'high_water': "262144", 'low_water': "65536"})
 
 class ServerClientListener(WSListener):
-    def __init__(self):
-        self.connection = None
+    def __init__(self, codec: Codec = CODEC):
         self.uuid = None
+        self.login_pending = False # Set while a login waits on the hashing pool; the dispatcher holds the client's other events until it's done
+        self._transport: WSTransport | None = None
+        self._paused: set[str] = set()
+        self._loop: AbstractEventLoop | None = None
+        self._loop_thread: int | None = None
+        self._outbox: list[bytes] = []
+        self._outbox_lock = Lock()
+        self._flush_scheduled = False
+        self.codec = codec
 
     def on_ws_connected(self, transport: WSTransport):
+        self._transport = transport
+        self._loop = get_running_loop()
+        self._loop_thread = get_ident()
+        transport.underlying_transport.set_write_buffer_limits(int(WRITE_BUFFER_LIMITS['high_water']), int(WRITE_BUFFER_LIMITS['low_water']))
         eventQueue.put_nowait(ClientConnectedEvent(self))
 
+    def send(self, message: dict[str, any] | bytes) -> None:
+        """
+        Send a message to the client, from any thread. Pass the encoded bytes instead when the same message goes to
+        more than one client, unless the client's codec is stateful.
+
+        Messages are encoded straight away, and everything sent to the client within one loop tick goes out in a single
+        write, on the loop.
+        """
+        if not isinstance(message, bytes) and not self.codec.stateful:
+            message = self.codec.encode(message)
+        with self._outbox_lock:
+            if not isinstance(message, bytes): # A stateful codec has to encode messages in the order they go out
+                message = self.codec.encode(message)
+            self._outbox.append(message)
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+        if get_ident() == self._loop_thread:
+            self._loop.call_soon(self._flush)
+        else:
+            self._loop.call_soon_threadsafe(self._flush)
+
+    def _flush(self) -> None:
+        with self._outbox_lock:
+            payloads, self._outbox = self._outbox, []
+            self._flush_scheduled = False
+        # picows can only write one frame at a time, so the tick's frames are built here and joined. They are written
+        # on the loop as whole frames, so they can't split a ping or pong, and like picows, nothing goes out after a close
+        if self._transport.is_close_frame_sent or self._transport.is_disconnected or self._transport.underlying_transport.is_closing():
+            return
+        self._transport.underlying_transport.write(b"".join([frame(payload, self.codec.binary) for payload in payloads]))
+
+    def _close(self, transport: WSTransport, code: WSCloseCode) -> None:
+        """Close the connection, once everything already sent to the client has been handed to the transport."""
+        transport.send_close(code)
+        transport.disconnect()
+
+    def pause_writing(self):
+        self.pause_reading("write-buffer")
+
+    def resume_writing(self):
+        self.resume_reading("write-buffer")
+
+    def pause_reading(self, reason: str) -> None:
+        """Stop reading frames from the client until every reason it was paused for has been resumed."""
+        if len(self._paused) == 0 and self._transport is not None:
+            self._transport.underlying_transport.pause_reading()
+        self._paused.add(reason)
+
+    def resume_reading(self, reason: str) -> None:
+        if reason not in self._paused:
+            return
+        self._paused.discard(reason)
+        if len(self._paused) == 0 and self._transport is not None and not self._transport.underlying_transport.is_closing():
+            self._transport.underlying_transport.resume_reading()
+
     def on_ws_disconnected(self, transport: WSTransport):
-        if self.connection is not None:
-            self.connection.close()
-            LOGGER.info(f"Closed SQL Connection for client with uuid {self.uuid}", False)
         AUTH_LISTENERS.pop(self.uuid, None)
+        PROJECT_SUBSCRIPTIONS.unsubscribe_all(self)
         eventQueue.put_nowait(ClientDisconnectedEvent(self))
 
     def on_ws_frame(self, transport: WSTransport, frame: WSFrame):
@@ -34,29 +107,47 @@ class ServerClientListener(WSListener):
             transport.disconnect()
 
         else:
-            eventQueue.put_nowait(ClientMessageEvent(self, transport, loads(frame.get_payload_as_utf8_text())))
+            try:
+                payload = self.codec.decode(frame.get_payload_as_bytes())
+            except ValueError:
+                self.send({'type': "error", 'message': "Messages must be valid " + self.codec.name + "!"})
+                if self.codec.stateful: # What the client interned may no longer line up with what was decoded, so it has to start over
+                    self._loop.call_soon(self._close, transport, WSCloseCode.PROTOCOL_ERROR)
+                return
+            eventQueue.put_nowait(ClientMessageEvent(self, transport, payload))
 
     
-    def on_initial_connection(self, transport: WSTransport, payload: dict[str, any]) -> None:
-        if self.connection is None:
-            self.connection = openConnection()
-
-        if auth.username_exists(self.connection, payload['username']): # User exists
-            valid, errorMsg = auth.validate(self.connection, payload)
-            if not valid:
-                eventQueue.put_nowait(SendMessageEvent(self, transport, {'type': "error", 'message': errorMsg}))
+    def on_initial_connection(self, connection, transport: WSTransport, payload: dict[str, any]) -> None:
+        """Queue the password check for a login. The login completes in on_login_result once the hashing pool is done with it."""
+        created = not auth.username_exists(connection, payload['username'])
+        try:
+            if created: # User must be created
+                result = auth.hash_password(payload['password'])
+            else: # User exists
+                result = auth.validate(connection, payload)
+        except QueueFull as error:
+            self.send({'type': "error", 'message': error.errorMsg})
+            return
+
+        self.login_pending = True
+        result.add_done_callback(lambda result: eventQueue.put_nowait(LoginResultEvent(self, transport, payload, result, created)))
+
+    def on_login_result(self, connection, transport: WSTransport, payload: dict[str, any], result: Future, created: bool) -> None:
+        if not created:
+            if not result.result():
+                self.send({'type': "error", 'message': "Invalid password!"})
                 return
-            uid = auth.get_uuid_from_username(self.connection, payload['username'])
+            uid = auth.get_uuid_from_username(connection, payload['username'])
 
-        else: # User must be created
-            uid, hashword = auth.generate_userkey(self.connection, payload)
-            writeData(self.connection, 
-                "INSERT INTO users(useruuid, username, password) VALUES(%s,%s,%s);", 
-                uid, payload['username'], hashword
-            )
-            eventQueue.put_nowait(SendMessageEvent(self, transport, {'type': "account-creation-success"}))
+        else:
+            try:
+                uid = auth.create_user(connection, payload['username'], result.result())
+            except auth.DuplicateData as error:
+                self.send({'type': "error", 'message': error.errorMsg})
+                return
+            self.send({'type': "account-creation-success"})
 
         self.uuid = uid
-        eventQueue.put_nowait(SendMessageEvent(self, transport, {'type': "auth-success"}))
+        self.send({'type': "auth-success"})
 
         AUTH_LISTENERS[uid] = self
\ No newline at end of file
@@ -1,4 +1,5 @@
-from backend.connect import openConnection, writeData
+from backend.connect import openConnection, transaction, writeData
+from backend.projects import check_progress, rebuild_progress
 import json
 from pathlib import Path
 from csv import reader
@@ -9,7 +10,11 @@ path = Path(__file__).parent
 if __name__ == "__main__":
     CREATE_INI = True if input("Create database options file(y/n)? ").lower()[0] == "y" else False
     CREATE_TABLES = True if input("Create tables(y/n)? ").lower()[0] == "y" else False
+    TRACK_PROGRESS = True if CREATE_TABLES or input("Create or update project progress tracking(y/n)? ").lower()[0] == "y" else False
+    TRACK_FLUSHES = True if CREATE_TABLES or input("Create or update write-behind flush tracking(y/n)? ").lower()[0] == "y" else False
+    CREATE_INDEXES = True if CREATE_TABLES or input("Create indexes(y/n)? ").lower()[0] == "y" else False
     POPULATE_ITEMS = True if input("Populate items(y/n)? ").lower()[0] == "y" else False
+    CHECK_PROGRESS = True if input("Check project progress totals(y/n)? ").lower()[0] == "y" else False
 
     if CREATE_INI:
         host = input("Enter the host IP: ")
@@ -78,6 +83,48 @@ if __name__ == "__main__":
         "CONSTRAINT unique_entries UNIQUE NULLS NOT DISTINCT (inventory,item_id,project_id)" \
         ");"
         )
+    if TRACK_PROGRESS:
+        # Gathered totals per project and item, kept up to date by a trigger in the same transaction as the stored_items change.
+        # Safe to run again on an existing database, where it also backfills the totals from what is already stored.
+        with transaction(connection):
+            writeData(connection, 
+            "CREATE TABLE IF NOT EXISTS project_progress(" \
+            "project_id INTEGER NOT NULL REFERENCES projects ON DELETE CASCADE," \
+            "item_id VARCHAR(64) NOT NULL REFERENCES items ON DELETE CASCADE," \
+            "gathered BIGINT NOT NULL DEFAULT 0," \
+            "PRIMARY KEY (project_id,item_id)" \
+            ");" \
+            "CREATE OR REPLACE FUNCTION track_project_progress() RETURNS trigger AS $$ " \
+            "BEGIN " \
+            "IF TG_OP <> 'INSERT' AND OLD.project_id IS NOT NULL THEN " \
+            "UPDATE project_progress SET gathered = gathered - COALESCE(OLD.item_count, 0) " \
+            "WHERE project_id = OLD.project_id AND item_id = OLD.item_id; " \
+            "END IF; " \
+            "IF TG_OP <> 'DELETE' AND NEW.project_id IS NOT NULL THEN " \
+            "INSERT INTO project_progress(project_id,item_id,gathered) VALUES(NEW.project_id, NEW.item_id, COALESCE(NEW.item_count, 0)) " \
+            "ON CONFLICT (project_id,item_id) DO UPDATE SET gathered = project_progress.gathered + EXCLUDED.gathered; " \
+            "END IF; " \
+            "RETURN NULL; " \
+            "END; " \
+            "$$ LANGUAGE plpgsql;" \
+            "DROP TRIGGER IF EXISTS stored_items_progress ON stored_items;" \
+            "CREATE TRIGGER stored_items_progress AFTER INSERT OR UPDATE OR DELETE ON stored_items " \
+            "FOR EACH ROW EXECUTE FUNCTION track_project_progress();"
+            )
+            rebuild_progress(connection)
+    if TRACK_FLUSHES:
+        # The flushes of each write-behind journal that have been applied, so replaying the journal skips their changes
+        writeData(connection, 
+        "CREATE TABLE IF NOT EXISTS write_behind_flushes(" \
+        "journal VARCHAR(255) NOT NULL," \
+        "sequence BIGINT NOT NULL," \
+        "PRIMARY KEY (journal,sequence)" \
+        ");"
+        )
+    if CREATE_INDEXES:
+        writeData(connection, 
+        "CREATE UNIQUE INDEX IF NOT EXISTS users_username_lower ON users (lower(username));"
+        )
     if POPULATE_ITEMS:
         game = input("Enter the game ID: ")
         style = input("Enter the input style(json/csv): ").lower()
@@ -97,4 +144,11 @@ if __name__ == "__main__":
                     id = line[1]
                     name = line[0]
                     writeData(connection, "INSERT INTO items(item_id,item_name,item_type) VALUES(%s,%s,%s);",
-                                id, name, "item")
\ No newline at end of file
+                                id, name, "item")
+    if CHECK_PROGRESS:
+        mismatches = check_progress(connection)
+        for project_id, item_id, stored, actual in mismatches:
+            print(f"Project {project_id} has {stored}x {item_id} recorded as gathered, but {actual}x are reserved")
+        print(f"Found {len(mismatches)} mismatched progress totals")
+        if len(mismatches) != 0 and input("Rebuild project progress totals(y/n)? ").lower()[0] == "y":
+            rebuild_progress(connection)
\ No newline at end of file
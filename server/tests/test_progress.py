@@ -0,0 +1,65 @@
+"""
+Run from the server directory with: python -m unittest discover tests
+No database is needed; the pool and hashing queue are replaced before the server's globals are created.
+"""
+from unittest import TestCase, main, mock
+
+import backend.connect
+import backend.hashing
+
+with mock.patch.object(backend.connect, "openPool"), mock.patch.object(backend.hashing, "openHashingQueue"):
+    from globals import AUTH_LISTENERS, PROJECT_SUBSCRIPTIONS
+    from events import ProjectHandler
+    from events.Events import ProjectProgressEvent
+    from utils.wire import CODEC
+
+
+def subscriber(uuid: str):
+    listener = mock.MagicMock()
+    listener.uuid = uuid
+    listener.codec = CODEC
+    AUTH_LISTENERS[uuid] = listener
+    return listener
+
+
+class ProgressHandlerTest(TestCase):
+    def setUp(self):
+        self.connection = object()
+        patches = [
+            mock.patch.object(ProjectHandler, "leasedConnection", return_value=self.connection),
+            mock.patch.object(ProjectHandler.permissions, "can_access_project", side_effect=lambda connection, uuid, id: uuid != "outsider"),
+            mock.patch.object(ProjectHandler.projects, "get_progress", return_value={"oak_log&17": {'goal': 64, 'gathered': 12}})
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.addCleanup(AUTH_LISTENERS.clear)
+        self.addCleanup(PROJECT_SUBSCRIPTIONS.drop, 4)
+
+    def test_pushes_changes_to_subscribers(self):
+        listener = subscriber("member")
+        PROJECT_SUBSCRIPTIONS.subscribe(4, listener)
+        PROJECT_SUBSCRIPTIONS.touch(4, "oak_log&17")
+
+        self.assertEqual(ProjectHandler.ProgressHandler(ProjectProgressEvent()), 0)
+
+        ProjectHandler.projects.get_progress.assert_called_once_with(self.connection, 4, ["oak_log&17"])
+        listener.send.assert_called_once()
+        self.assertEqual(CODEC.decode(listener.send.call_args.args[0]),
+            {'type': "project-progress", 'projects': {"4": {"oak_log&17": {'goal': 64, 'gathered': 12}}}})
+        self.assertFalse(PROJECT_SUBSCRIPTIONS.pending())
+
+    def test_drops_subscribers_that_lost_access(self):
+        listener = subscriber("outsider")
+        PROJECT_SUBSCRIPTIONS.subscribe(4, listener)
+        PROJECT_SUBSCRIPTIONS.touch(4, "oak_log&17")
+
+        self.assertEqual(ProjectHandler.ProgressHandler(ProjectProgressEvent()), 0)
+
+        listener.send.assert_not_called()
+        PROJECT_SUBSCRIPTIONS.touch(4, "oak_log&17")
+        self.assertFalse(PROJECT_SUBSCRIPTIONS.pending())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Run from the server directory with: python -m unittest discover tests
+"""
+from unittest import TestCase, main
+
+from utils.schema import Schema
+
+
+class SchemaTest(TestCase):
+    def setUp(self):
+        self.schema = Schema(["project_id", "item_id", "item_qty"], {'project_id': int, 'item_qty': int, 'limit': int},
+                             optional=["limit"])
+
+    def test_coerces_typed_fields(self):
+        payload = {'project_id': "4", 'item_id': "oak_log&17", 'item_qty': 12.0}
+
+        self.assertIsNone(self.schema.validate(payload))
+
+        self.assertEqual(payload, {'project_id': 4, 'item_id': "oak_log&17", 'item_qty': 12})
+
+    def test_reports_every_missing_field(self):
+        self.assertEqual(self.schema.validate({'item_id': "oak_log&17"}), "Missing fields: project_id, item_qty")
+
+    def test_rejects_values_that_cant_be_coerced(self):
+        self.assertEqual(self.schema.validate({'project_id': "four", 'item_id': "oak_log&17", 'item_qty': 1}),
+                         "Invalid value for project_id!")
+        self.assertEqual(self.schema.validate({'project_id': 4, 'item_id': "oak_log&17", 'item_qty': None}),
+                         "Invalid value for item_qty!")
+
+    def test_optional_fields_may_be_left_out_or_null(self):
+        payload = {'project_id': 4, 'item_id': "oak_log&17", 'item_qty': 1}
+        self.assertIsNone(self.schema.validate(payload))
+        self.assertNotIn("limit", payload)
+
+        payload['limit'] = None
+        self.assertIsNone(self.schema.validate(payload))
+        self.assertIsNone(payload['limit'])
+
+    def test_optional_fields_are_coerced_when_given(self):
+        payload = {'project_id': 4, 'item_id': "oak_log&17", 'item_qty': 1, 'limit': "50"}
+        self.assertIsNone(self.schema.validate(payload))
+        self.assertEqual(payload['limit'], 50)
+
+        payload['limit'] = "all"
+        self.assertEqual(self.schema.validate(payload), "Invalid value for limit!")
+
+
+if __name__ == "__main__":
+    main()
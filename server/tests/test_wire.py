@@ -0,0 +1,64 @@
+"""
+Run from the server directory with: python -m unittest discover tests
+The MessagePack tests are skipped when msgpack isn't installed.
+"""
+from unittest import TestCase, main, skipIf
+
+from utils.wire import JsonCodec, MsgpackCodec, msgpack
+
+
+class JsonCodecTest(TestCase):
+    def test_decode_errors_are_value_errors(self):
+        for codec in (JsonCodec(), JsonCodec(fast=False)):
+            with self.assertRaises(ValueError):
+                codec.decode(b"{\"type\": ")
+
+
+@skipIf(msgpack is None, "msgpack isn't installed")
+class MsgpackCodecTest(TestCase):
+    def setUp(self):
+        # Messages go from the sender's encoder to the receiver's decoder, as they would between the server and a client
+        self.sender = MsgpackCodec()
+        self.receiver = MsgpackCodec()
+
+    def test_round_trips_and_interns_long_strings(self):
+        message = {'type': "item-info", 'items': [["oak_log&17", 12, None], ["oak_log&17", 3, 4]], 'inventory': "chest-0001"}
+
+        first = self.sender.encode(message)
+        second = self.sender.encode(message)
+
+        self.assertEqual(self.receiver.decode(first), message)
+        self.assertEqual(self.receiver.decode(second), message)
+        self.assertLess(len(second), len(first))
+
+    def test_short_strings_are_sent_as_they_are(self):
+        self.assertEqual(self.sender.encode({'type': "error"}), msgpack.packb({'type': "error"}))
+
+    def test_interning_stops_once_the_table_is_full(self):
+        sender, receiver = MsgpackCodec(table_size=1), MsgpackCodec(table_size=1)
+        message = ["first long string", "second long string"]
+
+        for i in range(2):
+            self.assertEqual(receiver.decode(sender.encode(message)), message)
+
+    def test_decode_errors_are_value_errors(self):
+        with self.assertRaises(ValueError):
+            self.receiver.decode(b"\xc1")
+        with self.assertRaises(ValueError):
+            self.receiver.decode(msgpack.packb(msgpack.ExtType(MsgpackCodec.REFERENCE, (0).to_bytes(2, "big"))))
+
+    def test_failed_decode_keeps_no_definitions(self):
+        broken = msgpack.packb([
+            msgpack.ExtType(MsgpackCodec.DEFINE, "oak_log&17".encode()),
+            msgpack.ExtType(MsgpackCodec.REFERENCE, (5).to_bytes(2, "big"))
+        ])
+        with self.assertRaises(ValueError):
+            self.receiver.decode(broken)
+
+        # The client's table is still empty as well, so what it defines next takes the first index again
+        message = ["chest-0001", "chest-0001"]
+        self.assertEqual(self.receiver.decode(self.sender.encode(message)), message)
+
+
+if __name__ == "__main__":
+    main()
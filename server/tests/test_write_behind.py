@@ -0,0 +1,145 @@
+"""
+Run from the server directory with: python -m unittest discover tests
+No database is needed; the statements the buffer runs are replaced, and its journal is written to a temporary directory.
+"""
+from json import dumps
+from os.path import join
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main, mock
+
+from psycopg2 import IntegrityError, OperationalError
+
+from backend import items
+from backend.items import WriteBehindBuffer
+
+OAK = (1, "oak_log&17", None)
+STONE = (2, "stone&1", 4)
+
+
+class Connection():
+    """Just enough of a PreparingConnection to open units of work and savepoints on."""
+    def __init__(self):
+        self.unit = None
+        self.closed = False
+
+    def cursor(self):
+        return mock.MagicMock()
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class WriteBehindBufferTest(TestCase):
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.journal = join(directory.name, "item_journal")
+        self.recorded: list[int] = []
+        self.writes = mock.MagicMock()
+        self.applied = mock.MagicMock()
+        patches = [
+            mock.patch.object(items, "queryData", side_effect=lambda connection, query, *args, **kwargs: [(sequence,) for sequence in self.recorded]),
+            mock.patch.object(items, "writeData", self.writes),
+            mock.patch.object(items, "apply_item_changes", self.applied)
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def write_journal(self, *entries):
+        with open(self.journal, "w") as journal:
+            for entry in entries:
+                journal.write((entry if isinstance(entry, str) else dumps(entry)) + "\n")
+
+    def read_journal(self) -> list[str]:
+        with open(self.journal) as journal:
+            return journal.read().splitlines()
+
+    def start(self) -> WriteBehindBuffer:
+        buffer = WriteBehindBuffer(self.journal, 1024, 1)
+        buffer.start(Connection())
+        self.addCleanup(buffer.close)
+        return buffer
+
+    def test_replay_sums_changes_and_rewrites_the_journal(self):
+        self.write_journal([1, "oak_log&17", 5, None], [1, "oak_log&17", -2, None], [2, "stone&1", 3, 4], "[1, \"oak_lo")
+
+        buffer = self.start()
+
+        self.assertEqual(buffer.unapplied(OAK, []), 3)
+        self.assertEqual(buffer.unapplied(STONE, []), 3)
+        self.assertEqual(self.read_journal(), [dumps([1, "oak_log&17", 3, None]), dumps([2, "stone&1", 3, 4])])
+
+    def test_replay_skips_flushes_the_database_recorded(self):
+        self.write_journal([1, "oak_log&17", 5, None], {'flushed': 7}, [2, "stone&1", 3, 4])
+        self.recorded = [7]
+
+        buffer = self.start()
+
+        self.assertEqual(buffer.unapplied(OAK, []), 0)
+        self.assertEqual(buffer.unapplied(STONE, []), 3)
+        buffer.flush(Connection())
+        self.writes.assert_any_call(mock.ANY, items.RECORD_FLUSH, self.journal, 8)
+
+    def test_replay_requeues_flushes_that_never_committed(self):
+        self.write_journal([1, "oak_log&17", 5, None], {'flushed': 7}, [1, "oak_log&17", 1, None])
+
+        buffer = self.start()
+
+        self.assertEqual(buffer.unapplied(OAK, []), 6)
+
+    def test_replay_is_idempotent(self):
+        self.write_journal([1, "oak_log&17", 5, None], {'flushed': 7}, [2, "stone&1", 3, 4])
+        self.recorded = [7]
+        self.start().close()
+
+        buffer = self.start()
+
+        self.assertEqual(buffer.unapplied(OAK, []), 0)
+        self.assertEqual(buffer.unapplied(STONE, []), 3)
+
+    def test_committed_flush_empties_the_journal(self):
+        buffer = self.start()
+        buffer.add(*OAK[:2], 5, OAK[2])
+        buffer.add(*STONE[:2], 3, STONE[2])
+
+        self.assertEqual(buffer.flush(Connection()), 2)
+
+        self.applied.assert_called_once_with(mock.ANY, [(1, "oak_log&17", 5, None), (2, "stone&1", 3, 4)])
+        self.assertEqual(buffer.unapplied(OAK, []), 0)
+        self.assertEqual(self.read_journal(), [])
+
+    def test_rolled_back_flush_is_queued_again(self):
+        buffer = self.start()
+        buffer.add(*OAK[:2], 5, OAK[2])
+        self.writes.side_effect = OperationalError("connection lost")
+
+        with self.assertRaises(OperationalError):
+            buffer.flush(Connection())
+
+        self.assertEqual(buffer.unapplied(OAK, []), 5)
+        self.assertEqual(self.read_journal(), [dumps([1, "oak_log&17", 5, None])])
+
+    def test_flush_drops_changes_that_cant_be_applied(self):
+        buffer = self.start()
+        buffer.on_dropped = mock.MagicMock()
+        buffer.add(*OAK[:2], 5, OAK[2])
+        buffer.add(*STONE[:2], 3, STONE[2])
+
+        def apply(connection, changes):
+            if any(change[3] == 4 for change in changes):
+                raise IntegrityError("project 4 was deleted")
+        self.applied.side_effect = apply
+
+        self.assertEqual(buffer.flush(Connection()), 1)
+
+        buffer.on_dropped.assert_called_once_with((2, "stone&1", 3, 4), mock.ANY)
+        self.assertEqual(buffer.unapplied(STONE, []), 0)
+        self.assertEqual(self.read_journal(), [])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,6 @@
+from utils.cache import LRUCache, MISSING
+from utils.eventqueue import EventQueue, Lane
 from utils.logger import Logger
-from utils.observer import Observable, Observer
\ No newline at end of file
+from utils.observer import Observable, Observer
+from utils.schema import Schema
+from utils.subscriptions import SubscriptionRegistry
\ No newline at end of file
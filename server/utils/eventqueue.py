@@ -0,0 +1,48 @@
+from asyncio import AbstractEventLoop, Queue
+from enum import IntEnum
+from heapq import heappop, heappush
+from itertools import count
+from threading import get_ident
+
+
+class Lane(IntEnum):
+    """The lanes of an EventQueue, from most to least urgent."""
+    CONTROL = 0
+    OUTBOUND = 1
+    WORK = 2
+
+
+class EventQueue(Queue):
+    """
+    An asyncio queue that can also be fed from worker threads, and hands items out by lane.
+
+    Items are taken from the most urgent lane that has any, and in the order they were put within a lane. An item's
+    lane is read from its lane attribute, defaulting to Lane.WORK.
+
+    Once bound to the running loop, puts made from any other thread are handed to the loop instead of touching the
+    queue directly.
+    """
+    def __init__(self, maxsize: int = 0):
+        super().__init__(maxsize)
+        self._loop: AbstractEventLoop | None = None
+        self._loop_thread: int | None = None
+
+    def _init(self, maxsize: int):
+        self._queue: list[tuple[int, int, object]] = []
+        self._order = count()
+
+    def _put(self, item):
+        heappush(self._queue, (getattr(item, "lane", Lane.WORK), next(self._order), item))
+
+    def _get(self):
+        return heappop(self._queue)[2]
+
+    def bind(self, loop: AbstractEventLoop):
+        self._loop = loop
+        self._loop_thread = get_ident()
+
+    def put_nowait(self, item):
+        if self._loop is None or get_ident() == self._loop_thread:
+            super().put_nowait(item)
+        else:
+            self._loop.call_soon_threadsafe(super().put_nowait, item)
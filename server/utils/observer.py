@@ -1,8 +1,11 @@
+from bisect import insort
+from threading import Lock
+from time import perf_counter
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
     from events import Event
-    
+
     from typing import Union
 
 
@@ -12,24 +15,67 @@ class Observer():
 
 
     def update(self, event: Event) -> Union[Event, int]:
+        """Inspect or replace the event. Returning an int stops the chain, and the event is resolved with that code."""
         pass
- 
+
 
 class Observable():
+    """
+    An ordered chain of observers, highest priority first. Observers of equal priority run in the order they were attached.
+
+    The chain is compiled into a tuple whenever observers are attached or detached, so resolving never copies or sorts.
+    With timing enabled, the calls and total seconds spent in each observer are kept in timings.
+    """
     def __init__(self):
         self._observers: list[tuple[Observer, int]] = []
-        
+        self._chain: tuple[Observer, ...] = ()
+        self._lock = Lock()
+        self.timed = False
+        self.timings: dict[Observer, list[int | float]] = {}
+
+    @property
+    def observed(self) -> bool:
+        return len(self._chain) != 0
 
     def attach(self, observer: Observer, priority: int):
-        for i in range(len(self._observers)):
-            if priority > self._observers[i][1]:
-                self._observers.insert(i, (observer, priority))
-                return
-        self._observers.append((observer, priority))
+        with self._lock:
+            insort(self._observers, (observer, priority), key=lambda entry: -entry[1])
+            self._chain = tuple(entry[0] for entry in self._observers)
+
+    def detach(self, observer: Observer):
+        with self._lock:
+            self._observers = [entry for entry in self._observers if entry[0] is not observer]
+            self._chain = tuple(entry[0] for entry in self._observers)
+            self.timings.pop(observer, None)
 
     def resolve(self, event: Event) -> Union[Event, int]:
-        for observer in [x[0] for x in self._observers]:
+        if self.timed:
+            return self._resolve_timed(event)
+        for observer in self._chain:
             event = observer.update(event)
-            if event is int:
+            if isinstance(event, int):
                 return event
-        return event
\ No newline at end of file
+        return event
+
+    def _resolve_timed(self, event: Event) -> Union[Event, int]:
+        for observer in self._chain:
+            start = perf_counter()
+            event = observer.update(event)
+            elapsed = perf_counter() - start
+            with self._lock:
+                timing = self.timings.setdefault(observer, [0, 0.0])
+                timing[0] += 1
+                timing[1] += elapsed
+            if isinstance(event, int):
+                return event
+        return event
+
+    def stats(self) -> dict[str, dict[str, int | float]]:
+        """The calls to and total seconds spent in observers since timing was enabled, by observer class name."""
+        stats = {}
+        with self._lock:
+            for observer, timing in self.timings.items():
+                totals = stats.setdefault(type(observer).__name__, {'calls': 0, 'seconds': 0.0})
+                totals['calls'] += timing[0]
+                totals['seconds'] += timing[1]
+        return stats
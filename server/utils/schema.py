@@ -0,0 +1,32 @@
+from typing import Callable
+
+
+class Schema():
+    """
+    The fields a message must carry, compiled once into a single pass that checks they are present and coerces the
+    typed ones to their types. Optional fields are coerced too, when they are given and aren't null.
+    """
+    def __init__(self, fields: list[str], types: dict[str, Callable[[any], any]] | None = None, optional: list[str] = ()):
+        self.fields = tuple(fields)
+        self.optional = tuple(optional)
+        self._coercions = tuple((field, types[field]) for field in fields if types is not None and field in types)
+        self._optional_coercions = tuple((field, types[field]) for field in optional if types is not None and field in types)
+
+    def validate(self, payload: dict[str, any]) -> str | None:
+        """Check the payload, coercing its typed fields in place. Returns a message describing the problem, or None if it is valid."""
+        missing = [field for field in self.fields if field not in payload]
+        if len(missing) != 0:
+            return "Missing fields: " + ", ".join(missing)
+        for field, coerce in self._coercions:
+            try:
+                payload[field] = coerce(payload[field])
+            except (TypeError, ValueError):
+                return f"Invalid value for {field}!"
+        for field, coerce in self._optional_coercions:
+            if payload.get(field) is None:
+                continue
+            try:
+                payload[field] = coerce(payload[field])
+            except (TypeError, ValueError):
+                return f"Invalid value for {field}!"
+        return None
@@ -0,0 +1,69 @@
+from threading import Lock
+
+
+class SubscriptionRegistry():
+    """
+    A thread safe mapping of topics to the subscribers watching them, which also collects the changes made to each topic.
+
+    Changes are gathered with touch and handed out all at once by take, so any number of changes to a topic between two
+    calls to take are coalesced into one.
+    """
+    def __init__(self):
+        self._subscribers: dict[object, dict[object, object]] = {}
+        self._changed: dict[object, set] = {}
+        self._lock = Lock()
+
+    def subscribe(self, topic, subscriber, context=None) -> None:
+        """Subscribe to the topic. The context is handed back alongside the subscriber by take."""
+        with self._lock:
+            self._subscribers.setdefault(topic, {})[subscriber] = context
+
+    def unsubscribe(self, topic, subscriber) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(topic)
+            if subscribers is None:
+                return
+            subscribers.pop(subscriber, None)
+            if len(subscribers) == 0:
+                del self._subscribers[topic]
+                self._changed.pop(topic, None)
+
+    def unsubscribe_all(self, subscriber) -> None:
+        """Remove the subscriber from every topic it is subscribed to."""
+        with self._lock:
+            for topic in [topic for topic, subscribers in self._subscribers.items() if subscriber in subscribers]:
+                self._subscribers[topic].pop(subscriber)
+                if len(self._subscribers[topic]) == 0:
+                    del self._subscribers[topic]
+                    self._changed.pop(topic, None)
+
+    def drop(self, topic) -> None:
+        """Remove the topic along with all of its subscribers."""
+        with self._lock:
+            self._subscribers.pop(topic, None)
+            self._changed.pop(topic, None)
+
+    def touch(self, topic, *keys) -> None:
+        """Record that the keys of the topic changed. Topics without subscribers are ignored."""
+        with self._lock:
+            if topic in self._subscribers:
+                self._changed.setdefault(topic, set()).update(keys)
+
+    def pending(self) -> bool:
+        with self._lock:
+            return len(self._changed) != 0
+
+    def take(self) -> dict[object, tuple[set, dict[object, object]]]:
+        """Hand out every topic changed since the last call, mapped to its changed keys and its subscribers with their contexts."""
+        with self._lock:
+            changed = {topic: (keys, dict(self._subscribers[topic])) for topic, keys in self._changed.items()}
+            self._changed.clear()
+        return changed
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                'topics': len(self._subscribers),
+                'subscriptions': sum(len(subscribers) for subscribers in self._subscribers.values()),
+                'pending': len(self._changed)
+            }
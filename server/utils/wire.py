@@ -0,0 +1,145 @@
+import json
+
+try:
+    import orjson
+except ImportError: # Optional; the standard library is used without it
+    orjson = None
+
+try:
+    import msgpack
+except ImportError: # Optional; the binary protocol isn't offered without it
+    msgpack = None
+
+
+class Codec():
+    """
+    Turns messages into frame payloads and back. Decoding works straight from the frame's bytes.
+
+    A stateful codec keeps state for the one connection it belongs to, so what it encodes can't be sent to anyone else.
+    """
+    name = ""
+    binary = False
+    stateful = False
+
+    def decode(self, data: bytes) -> any:
+        raise NotImplementedError
+
+    def encode(self, message: any) -> bytes:
+        raise NotImplementedError
+
+
+class JsonCodec(Codec):
+    """JSON text, using orjson when it is installed and the json module otherwise."""
+    name = "json"
+
+    def __init__(self, fast: bool = True):
+        self.fast = fast and orjson is not None
+
+    def decode(self, data: bytes) -> any:
+        if self.fast:
+            return orjson.loads(data)
+        return json.loads(data)
+
+    def encode(self, message: any) -> bytes:
+        if self.fast:
+            return orjson.dumps(message, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(message, separators=(",", ":")).encode()
+
+
+class MsgpackCodec(Codec):
+    """
+    MessagePack, with long strings interned per connection.
+
+    The first time a string of at least min_length characters is sent, it goes out as extension type 1 holding the
+    string, and is given the next index in the sender's table. After that it goes out as extension type 2 holding its
+    index as a 2 byte big-endian integer. Each side keeps its own table, so the client interns what it sends the same way.
+    Once a table holds table_size strings, new strings are sent as they are.
+    """
+    name = "MessagePack"
+    binary = True
+    stateful = True
+    DEFINE = 1
+    REFERENCE = 2
+
+    def __init__(self, min_length: int = 8, table_size: int = 65536):
+        self.min_length = min_length
+        self.table_size = table_size
+        self._packer = msgpack.Packer(use_bin_type=True)
+        self._sent: dict[str, msgpack.ExtType] = {} # Each string sent so far, and the reference to send in its place
+        self._received: list[str] = []
+
+    def decode(self, data: bytes) -> any:
+        """Decode a message. Strings it defines are only kept if all of it decodes, so the tables stay in step with the client's."""
+        defined = len(self._received)
+        try:
+            return msgpack.unpackb(data, ext_hook=self._resolve, strict_map_key=False)
+        except (ValueError, TypeError, IndexError) as error:
+            del self._received[defined:]
+            raise ValueError(error) from error
+
+    def _resolve(self, code: int, data: bytes) -> any:
+        if code == self.DEFINE:
+            string = data.decode()
+            if len(self._received) < self.table_size:
+                self._received.append(string)
+            return string
+        if code == self.REFERENCE:
+            return self._received[int.from_bytes(data, "big")]
+        return msgpack.ExtType(code, data)
+
+    def encode(self, message: any) -> bytes:
+        """Encode a message, interning its strings. Messages must be encoded in the order they are sent."""
+        return self._packer.pack(self._intern(message))
+
+    def _intern(self, value: any) -> any:
+        # Walked in the order msgpack writes things out, so a string is always defined before it is referenced
+        kind = type(value)
+        if kind is str:
+            if len(value) < self.min_length:
+                return value
+            reference = self._sent.get(value)
+            if reference is not None:
+                return reference
+            if len(self._sent) < self.table_size:
+                self._sent[value] = msgpack.ExtType(self.REFERENCE, len(self._sent).to_bytes(2, "big"))
+                return msgpack.ExtType(self.DEFINE, value.encode())
+            return value
+        if kind is dict:
+            return {self._intern(key): self._intern(item) for key, item in value.items()}
+        if kind is list or kind is tuple:
+            return [self._intern(item) for item in value]
+        return value
+
+
+# The codec every client starts out with
+CODEC: Codec = JsonCodec()
+
+# Websocket subprotocols a client can ask for, in the server's order of preference. The binary one is only offered when msgpack is installed.
+SUBPROTOCOLS = (["sgu.msgpack"] if msgpack is not None else []) + ["sgu.json"]
+
+def negotiate(offered: str | None) -> tuple[Codec, str | None]:
+    """
+    Pick the codec for a new connection from the Sec-WebSocket-Protocol header of its upgrade request.\n
+    Returns the codec and the subprotocol to accept, which is None if the client didn't ask for one this server speaks.
+    """
+    protocols = [protocol.strip() for protocol in (offered or "").split(",")]
+    for protocol in SUBPROTOCOLS:
+        if protocol not in protocols:
+            continue
+        if protocol == "sgu.msgpack":
+            return MsgpackCodec(), protocol
+        if protocol == "sgu.json":
+            return CODEC, protocol
+    return CODEC, None
+
+def frame(payload: bytes, binary: bool = False) -> bytes:
+    """Wrap an encoded message in a single, unmasked websocket text or binary frame, as sent from the server."""
+    opcode = 0x82 if binary else 0x81
+    length = len(payload)
+    if length < 126:
+        header = bytes((opcode, length))
+    elif length < 65536:
+        header = bytes((opcode, 126)) + length.to_bytes(2, "big")
+    else:
+        header = bytes((opcode, 127)) + length.to_bytes(8, "big")
+    return header + payload